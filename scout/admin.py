@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from scout.models import Client, Project, StatusTest, StatusChange
+from scout.models import (Client, Project, StatusTest, StatusChange,
+                          ResponseTimeRollup)
 
 class ClientAdmin(admin.ModelAdmin):
     date_heirarchy = 'date_added'
@@ -25,9 +26,18 @@ class ProjectAdmin(admin.ModelAdmin):
 
 
 class StatusChangeAdmin(admin.ModelAdmin):
-    list_display = ['test', 'expected_status', 'returned_status', 'result']
+    list_display = ['test', 'expected_status', 'returned_status', 'result',
+                    'failure']
+
+
+class ResponseTimeRollupAdmin(admin.ModelAdmin):
+    date_heirarchy = 'period_start'
+    list_display = ['test', 'period_start', 'count', 'minimum', 'mean', 
+                    'p50', 'p95', 'p99', 'maximum', 'ttfb_mean']
+    list_filter = ['test__project']
 
 
 admin.site.register(Client, ClientAdmin)
 admin.site.register(Project, ProjectAdmin)
 admin.site.register(StatusChange, StatusChangeAdmin)
+admin.site.register(ResponseTimeRollup, ResponseTimeRollupAdmin)
@@ -0,0 +1,189 @@
+"""A benchmark of the pinger, run end to end against a local stub HTTP
+server so that it's repeatable, needs no network and engines can be
+compared like for like. See the scout_benchmark management command.
+
+Each generated test's URL tells the stub server how to answer it; how
+long to wait, the status code, the size of the body or whether to drop
+the connection. These are picked with a seeded random number generator
+so the same options always generate the same tests.
+"""
+import BaseHTTPServer
+import random
+import resource
+import SocketServer
+import threading
+import time
+import urlparse
+
+from django.conf import settings
+from django.db import connection, reset_queries, transaction
+from django.db.backends.signals import connection_created
+
+from scout.models import Client, Project, StatusTest, StatusChange
+
+
+class StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers each request as its query string says; `latency` (in
+    milliseconds), `status`, `size` (of the body, in bytes) and `drop`.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        options = dict(urlparse.parse_qsl(urlparse.urlparse(self.path).query))
+        time.sleep(int(options.get('latency', 0)) / 1000.0)
+        if options.get('drop'):
+            # Hang up without a response.
+            self.close_connection = 1
+            return
+        body = 'x' * int(options.get('size', 0))
+        self.send_response(int(options.get('status', 200)))
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    # Enough for a large pool of workers all connecting at once.
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # The pinger hangs up without reading the bodies it doesn't
+        # need, which isn't worth a traceback.
+        pass
+
+
+def start_stub_server(host='127.0.0.1', port=0):
+    """Starts the stub server in a background thread, on any free port
+    by default, and returns it.
+    """
+    server = StubServer((host, port), StubRequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def create_tests(base_url, count, tests_per_project=5, projects_per_client=10,
+                 latency=50, size=1024, error_rate=0.05, drop_rate=0.01,
+                 seed=0):
+    """Creates `count` StatusTests on the stub server at `base_url`,
+    spread over as many projects and clients as it takes. Latencies are
+    spread evenly up to twice `latency`, `error_rate` of the tests get
+    a 500 and `drop_rate` of them no response at all.
+    """
+    rng = random.Random(seed)
+    with transaction.commit_on_success():
+        for i in xrange(count):
+            if i % tests_per_project == 0:
+                if i % (tests_per_project * projects_per_client) == 0:
+                    client = Client.objects.create(name='Client %s' % i)
+                project = Project.objects.create(client=client,
+                                                 name='Project %s' % i)
+            query = 'latency=%s&size=%s' % (rng.randint(0, latency * 2), 
+                                            size)
+            roll = rng.random()
+            if roll < drop_rate:
+                query += '&drop=1'
+            elif roll < drop_rate + error_rate:
+                query += '&status=500'
+            StatusTest.objects.create(project=project, expected_status=200,
+                                      url='%s/check/%s?%s' % (base_url, i, 
+                                                              query))
+
+
+class QueryCounter(object):
+    """Counts the queries logged (with DEBUG on) by the calling thread
+    and by any thread which opens a database connection while it's 
+    counting, as some engines (gevent) write from threads of their own.
+    The connection's query log is local to each thread, so each 
+    thread's is picked up as its connection is opened.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._logs = []
+        self._counts = {}
+
+    def start(self):
+        connection_created.connect(self._connection_created)
+        self.reset()
+
+    def stop(self):
+        connection_created.disconnect(self._connection_created)
+
+    def reset(self):
+        with self._lock:
+            self._add_log(connection.queries)
+            self._counts = dict((id(log), len(log)) for log in self._logs)
+
+    def count(self):
+        with self._lock:
+            return sum(len(log) - self._counts.get(id(log), 0)
+                       for log in self._logs)
+
+    def _add_log(self, log):
+        if not any(log is other for other in self._logs):
+            self._logs.append(log)
+
+    def _connection_created(self, sender, connection, **kwargs):
+        # Sent from the thread opening the connection.
+        with self._lock:
+            self._add_log(connection.queries)
+
+
+def get_peak_rss():
+    """Returns the peak resident set size of the process in megabytes,
+    which includes the stub server running alongside the pinger.
+    """
+    # Reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_benchmark(runner, dispatch=None):
+    """Runs every test once with the runner, then the notification
+    dispatcher if given, and returns a dictionary of the measurements.
+    """
+    debug = settings.DEBUG
+    # For the query log.
+    settings.DEBUG = True
+    queries = QueryCounter()
+    queries.start()
+    try:
+        tests = list(runner.get_tests())
+        changes = StatusChange.objects.count()
+        queries.reset()
+        start = time.time()
+        runner.run_tests(tests)
+        elapsed = time.time() - start
+        query_count = queries.count()
+        results = {
+            'tests': len(tests),
+            'seconds': elapsed,
+            'checks_per_second': len(tests) / elapsed if elapsed else 0,
+            'queries_per_check': float(query_count) / len(tests) 
+                                 if tests else 0,
+            'changes': StatusChange.objects.count() - changes,
+        }
+        if dispatch is not None:
+            queries.reset()
+            start = time.time()
+            sent, failed = dispatch()
+            results.update({
+                'notifications': sent + failed,
+                'notification_seconds': time.time() - start,
+                'notification_queries': queries.count(),
+            })
+        results['peak_rss_mb'] = get_peak_rss()
+        return results
+    finally:
+        queries.stop()
+        settings.DEBUG = debug
+        reset_queries()
@@ -1,12 +1,83 @@
 import datetime
+import socket
+import threading
+import time
+from collections import defaultdict, namedtuple
+from Queue import Queue, Empty
 from urllib2 import URLError
+from urlparse import urlparse
 
 import requests
+from django.db import transaction
+from django.db.models import F, Max, Q
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connection import HTTPConnection
+from requests.packages.urllib3.exceptions import (HTTPError as 
+                                                  UrllibHTTPError,
+                                                  ReadTimeoutError)
+try:
+    from requests.packages.urllib3.util.connection import allowed_gai_family
+except ImportError:
+    # Older versions of urllib3 look up every address family.
+    allowed_gai_family = lambda: socket.AF_UNSPEC
 from scout.logger import log
-from scout.models import StatusTest, StatusChange
-from scout.settings import RESPONSE_HANDLERS
-from scout.utils import get_module_from_module_string
+from scout.models import Project, StatusTest, StatusChange, UptimeBucket
+from scout.settings import (RESPONSE_HANDLERS, BATCH_RESPONSE_HANDLERS,
+                            BATCH_SIZE, MAX_WORKERS, POOL_CONNECTIONS,
+                            POOL_MAXSIZE, CONNECT_TIMEOUT, READ_TIMEOUT,
+                            RUN_DEADLINE, UPTIME_MAX_GAP, 
+                            ADAPTIVE_SCHEDULING, CONDITIONAL_REQUESTS,
+                            DRAIN_BODY_BYTES, DNS_CACHE_TTL, METRICS)
+from scout.metrics import MetricsRecorder, set_gauges, is_cache_shared
+from scout.resolver import get_dns_cache
+from scout.scheduler import get_check_interval
+from scout.state import notify_change
+from scout.utils import chunked, get_module_from_module_string
+from scout.validators import (get_cached_response, get_conditional_headers,
+                              cache_response, use_cached_response)
 
+# The outcome of running a single test, `response` being either a
+# requests response or a CheckFailure and `elapsed` the number of
+# seconds the request took (None if it was never made).
+CheckResult = namedtuple('CheckResult', 'test response elapsed')
+
+# Tests falling due within this many seconds are run now rather than 
+# left for the next run, which cron may start a little early.
+SCHEDULE_LEEWAY = 5
+
+# The number of TCP connections urllib3 has opened in this process,
+# counted by wrapping the method of its connection class which opens
+# them (see _count_connections); its pools only count the connection
+# objects they create, which are reconnected when dropped.
+_connections_opened = [0]
+_connections_lock = threading.Lock()
+
+
+def _count_connections():
+    """Wraps HTTPConnection._new_conn (also used for HTTPS) to count
+    the connections it opens, the first time it's called.
+    """
+    with _connections_lock:
+        new_conn = HTTPConnection._new_conn
+        if getattr(new_conn, 'counted', False):
+            return
+        def _new_conn(self):
+            sock = new_conn(self)
+            with _connections_lock:
+                _connections_opened[0] += 1
+            return sock
+        _new_conn.counted = True
+        HTTPConnection._new_conn = _new_conn
+
+
+class CheckFailure(object):
+    """Stands in for the response of a test which failed to get one,
+    `reason` being one of the StatusChange.FAILURE_* choices.
+    """
+
+    def __init__(self, reason, error=None):
+        self.reason = reason
+        self.error = error
 
 
 class PingRunner(object):
@@ -14,18 +85,77 @@ class PingRunner(object):
     the request tests and deals with them appropriately.
     """
 
-    def __init__(self, response_handlers=False, *args, **kwargs):
+    def __init__(self, response_handlers=False, workers=None, deadline=None,
+                 shard=None, batch_response_handlers=False, *args, **kwargs):
         """Initialise the ping runner.
         * response_handlers = an iterative of module strings to load the 
                               response handlers, if none are provided then 
                               the one found via the settings are used.
+        * workers = the number of requests which may be in flight at 
+                    once, defaults to SCOUT_MAX_WORKERS. A value of 1
+                    runs the tests one after another.
+        * deadline = the number of seconds a run may take, any tests 
+                     still unfinished after this are abandoned and 
+                     logged as timeouts. Defaults to SCOUT_RUN_DEADLINE,
+                     where None means runs may take as long as needed.
+        * shard = a ShardCoordinator used to limit the tests to those
+                  belonging to this node, when sharing them with others.
+        * batch_response_handlers = as response_handlers but for the batch
+                                    response handlers, which are handed 
+                                    the results in bulk.
         """
+        self.shard = shard
+        self.workers = max(1, workers or MAX_WORKERS)
+        self.deadline = deadline or RUN_DEADLINE
+        self._run_deadline = None
+        self._run_started = None
+        self.session = self._setup_session()
+        # Shared by every worker, and every runner in the process.
+        self.dns_cache = None
+        if DNS_CACHE_TTL:
+            self.dns_cache = get_dns_cache()
+        self.metrics = None
+        if METRICS:
+            if is_cache_shared():
+                self.metrics = MetricsRecorder()
+            else:
+                log.warn("SCOUT_METRICS needs a cache shared between "
+                         "processes, not recording them.")
+        self._run_failures = 0
+        # Maps StatusTest pks to their latest StatusChange (or None), this
+        # is loaded in bulk at the start of a run and kept up to date 
+        # as changes are logged.
+        self._last_logs = {}
+        # The pks of the projects with tests run since the project 
+        # statuses were last saved.
+        self._tested_projects = set()
+        # The tests run since their last_checked (and next_check)
+        # timestamps were last saved, keyed by pk.
+        self._tested_tests = {}
+        # Maps (test pk, day) to the [up, down] seconds 
+        # to be added to its UptimeBucket.
+        self._uptime = defaultdict(lambda: [0, 0])
         if response_handlers:
             self.response_handlers = self._setup_response_handlers(
                                         response_handlers)
         else:
             self.response_handlers = self._setup_response_handlers(
                                         RESPONSE_HANDLERS)
+        # Batch handlers are instantiated just the once, and then
+        # handed each batch of results as it's completed.
+        self.batch_response_handlers = [handler() for handler in 
+                self._setup_response_handlers(batch_response_handlers or
+                                              BATCH_RESPONSE_HANDLERS)]
+        self._batch = []
+        self._batch_lock = threading.RLock()
+        self.needs_body = any(getattr(handler, 'needs_body', False)
+                              for handler in self.response_handlers + 
+                                             self.batch_response_handlers)
+        self.conditional = CONDITIONAL_REQUESTS and self.needs_body
+        if self.conditional and not is_cache_shared():
+            log.warn("SCOUT_CONDITIONAL_REQUESTS needs a cache shared "
+                     "between processes, not making requests conditional.")
+            self.conditional = False
 
     def _setup_response_handlers(self, response_handlers):
         """Returns a list of classes as loaded from the list 
@@ -36,39 +166,371 @@ class PingRunner(object):
             handlers.append(get_module_from_module_string(handler_string))
         return handlers
 
-    def get_tests(self):
+    def _setup_session(self):
+        """Returns the requests session which all of the tests are
+        made through; it is kept for the lifetime of the runner so
+        connections are reused between tests (and runs) against
+        the same host.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                              pool_maxsize=POOL_MAXSIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _count_connections()
+        return session
+
+    def _connection_stats(self):
+        """Returns a two element tuple of the number of connections
+        opened by the process and the number of requests made by the
+        session so far. Hosts which have dropped out of the pool don't
+        have their requests counted.
+        """
+        with _connections_lock:
+            connections = _connections_opened[0]
+        requests_made = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_made += pool.num_requests
+        return connections, requests_made
+
+    def _dns_stats(self):
+        """Returns a two element tuple of the DNS cache's hits and 
+        misses so far.
+        """
+        if self.dns_cache is None:
+            return 0, 0
+        return self.dns_cache.stats()
+
+    def get_tests(self, due=False):
         """Returns a queryset of StatusTest objects which
-        will are ready to be tested.
+        will are ready to be tested; only those which are 
+        due if `due` is set and scheduling is adaptive.
         """
         # Gets all active tests where the project and client
         # are also set to active.
-        return StatusTest.active.all()
+        tests = StatusTest.active.select_related('last_change')
+        if due and ADAPTIVE_SCHEDULING:
+            due_by = datetime.datetime.now() + \
+                        datetime.timedelta(seconds=SCHEDULE_LEEWAY)
+            tests = tests.filter(Q(next_check__isnull=True) | 
+                                 Q(next_check__lte=due_by))
+        if self.shard is not None:
+            return self.shard.filter_tests(list(tests))
+        return tests
 
     def run_tests(self, tests=False):
         """The actual runner method, runs the tests and reports back
         True if it ran succesfully. A queryset of StatusTests can be
         provided for overrideability but the default is to use those
-        provided by self.get_tests()
+        provided by the tests which are due from self.get_tests()
         """
+        start = time.time()
+        self._run_started = datetime.datetime.now()
+        self._run_failures = 0
         if not tests:
-            tests = self.get_tests()
-        for test in tests:
-            self.run_single_test(test)
+            tests = self.get_tests(due=True)
+        tests = list(tests)
+        # How far behind schedule the most overdue test is.
+        queue_lag = max([0] + [
+                    (self._run_started - test.next_check).total_seconds()
+                    for test in tests if test.next_check is not None])
+        self._last_logs.update(self._get_last_logs(tests))
+        connections, requests_made = self._connection_stats()
+        dns_hits, dns_misses = self._dns_stats()
+        self._run_deadline = None
+        if self.deadline:
+            self._run_deadline = time.time() + self.deadline
+        self._check_all(tests)
+        self._run_batch_response_handlers()
+        save_start = time.time()
+        self._save_test_statuses()
+        self._save_project_statuses()
+        self._save_uptime()
+        if self.metrics is not None:
+            self.metrics.flush()
+            set_gauges(last_run_timestamp_seconds=int(time.time()),
+                       last_run_duration_seconds=time.time() - start,
+                       last_run_tests=len(tests),
+                       last_run_failures=self._run_failures,
+                       last_run_queue_lag_seconds=queue_lag,
+                       last_run_save_seconds=time.time() - save_start)
+        new_connections, new_requests_made = self._connection_stats()
+        log.info('Made %s requests over %s new connections.' % (
+                                    new_requests_made - requests_made,
+                                    new_connections - connections))
+        new_dns_hits, new_dns_misses = self._dns_stats()
+        log.info('Looked up %s hostnames, %s from the DNS cache.' % (
+                    new_dns_hits + new_dns_misses - dns_hits - dns_misses,
+                    new_dns_hits - dns_hits))
         return
 
     def run_single_test(self, test):
-        """Given a StatusTest object, runs the test.
+        """Given a StatusTest object, runs the test and saves its
+        status, as at the end of a run.
+        """
+        self._run_started = datetime.datetime.now()
+        self._run_deadline = None
+        self._process_result(self._fetch(test))
+        self._run_batch_response_handlers()
+        self._save_test_statuses()
+        self._save_project_statuses()
+        self._save_uptime()
+        if self.metrics is not None:
+            self.metrics.flush()
+        return
+
+    def _check_all(self, tests):
+        """Fetches and then processes the response for every test,
+        alternative engines override this to change how the 
+        requests are scheduled.
+        """
+        for result in self._fetch_all(tests):
+            self._process_result(result)
+        return
+
+    def _fetch_all(self, tests):
+        """Yields a CheckResult for each of the tests as the 
+        responses come in. With more than one worker the requests 
+        are made from a pool of threads but the results are still 
+        yielded in the calling thread, so everything which 
+        touches the database stays out of the workers. Tests not
+        finished by the run deadline are yielded as timeouts.
+        """
+        if self.workers == 1:
+            for test in tests:
+                if self._deadline_passed():
+                    yield self._abandon(test)
+                else:
+                    yield self._fetch(test)
+            return
+        tests = list(tests)
+        pending = Queue()
+        results = Queue()
+        cancelled = threading.Event()
+        for test in tests:
+            pending.put(test)
+
+        def worker():
+            while not cancelled.is_set():
+                try:
+                    test = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    result = self._fetch(test)
+                except Exception, e:
+                    # Anything escaping here would otherwise leave 
+                    # the run waiting forever on a missing result.
+                    log.exception('Unhandled error testing URL: %s' % \
+                                  test.url)
+                    result = CheckResult(test, CheckFailure(
+                                StatusChange.FAILURE_CONNECTION, e), None)
+                results.put(result)
+
+        for i in range(min(self.workers, len(tests))):
+            thread = threading.Thread(target=worker)
+            # Daemonic so a stuck request can never 
+            # keep the process alive on its own.
+            thread.daemon = True
+            thread.start()
+        unfinished = set(test.pk for test in tests)
+        try:
+            while unfinished:
+                try:
+                    result = results.get(timeout=self._time_remaining())
+                except Empty:
+                    break
+                unfinished.discard(result.test.pk)
+                yield result
+        finally:
+            cancelled.set()
+        for test in tests:
+            if test.pk in unfinished:
+                yield self._abandon(test)
+
+    def _time_remaining(self):
+        """Returns the number of seconds left until the run deadline,
+        or None if the run has no deadline.
+        """
+        if self._run_deadline is None:
+            return None
+        return max(0, self._run_deadline - time.time())
+
+    def _deadline_passed(self):
+        return self._time_remaining() == 0
+
+    def _abandon(self, test):
+        """Returns the result recorded for a test which did not
+        finish before the run deadline.
+        """
+        log.info('Run deadline passed before testing URL: %s' % test.url)
+        return CheckResult(test, CheckFailure(StatusChange.FAILURE_TIMEOUT),
+                           None)
+
+    def _get_timeout(self, test):
+        """Returns the (connect, read) timeout tuple for the test, the
+        global settings are used where the test doesn't set its own.
+        Neither is allowed to run past the run deadline.
+        """
+        connect = test.connect_timeout or CONNECT_TIMEOUT
+        read = test.read_timeout or READ_TIMEOUT
+        remaining = self._time_remaining()
+        if remaining is not None:
+            remaining = max(remaining, 0.01)
+            connect, read = min(connect, remaining), min(read, remaining)
+        return connect, read
+
+    def _fetch(self, test):
+        """Makes the HTTP request for the test; returns a CheckResult
+        holding the response, or a CheckFailure if one could not be
+        obtained. This is the only part of a test which is run from 
+        the worker threads so it must not touch the database.
         """
         log.info('Testing URL: %s' % test.url)
+        start = time.time()
+        if self.dns_cache is not None:
+            self._resolve(test)
+            self._observe('dns', time.time() - start)
+        cached = None
+        if self._is_conditional(test):
+            cached = get_cached_response(test)
+        try:
+            # Streamed so that we return as soon as the headers are in 
+            # and can then decide how much, if any, of the body to read.
+            response = self.session.request(test.request_method, test.url,
+                                headers=get_conditional_headers(cached),
+                                timeout=self._get_timeout(test),
+                                stream=True)
+            # Up to the headers, as the body hasn't been read yet.
+            self._observe('ttfb', response.elapsed.total_seconds())
+            body_start = time.time()
+            self._read_body(test, response)
+            self._observe('body', time.time() - body_start)
+            if self._is_conditional(test):
+                if cached is not None and response.status_code == 304:
+                    # Unchanged, so the handlers get the last response.
+                    use_cached_response(response, cached)
+                else:
+                    cache_response(test, response)
+        except (requests.Timeout, ReadTimeoutError, socket.timeout), e:
+            # The urllib3 and socket errors come from reading the body
+            # straight from the raw response.
+            log.info('URL timed out. %s' % e)
+            response = CheckFailure(StatusChange.FAILURE_TIMEOUT, e)
+        except (URLError, requests.RequestException, UrllibHTTPError,
+                socket.error), e:
+            if self.dns_cache is not None and \
+                    self.dns_cache.failed(urlparse(test.url).hostname):
+                log.info('URL failed to resolve. %s' % e)
+                response = CheckFailure(StatusChange.FAILURE_DNS, e)
+            else:
+                log.info('URL failed to provide a response. %s' % e)
+                response = CheckFailure(StatusChange.FAILURE_CONNECTION, e)
+        return CheckResult(test, response, time.time() - start)
+
+    def _resolve(self, test):
+        """Looks the test's host up ahead of the request, so the time it
+        takes can be measured apart from the rest; the request then gets
+        the address from the DNS cache (or the failure to report).
+        """
+        url = urlparse(test.url)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        try:
+            self.dns_cache.resolve(url.hostname, port, allowed_gai_family(),
+                                   socket.SOCK_STREAM)
+        except socket.error:
+            pass
+
+    def _observe(self, phase, seconds):
+        """Records the time a phase of a check took, for the metrics.
+        """
+        if self.metrics is not None:
+            self.metrics.observe(phase, seconds)
+
+    def _is_conditional(self, test):
+        """Returns True if the test's requests should be conditional on
+        the page having changed; only worth it when the body is read.
+        """
+        return self.conditional and test.request_method == StatusTest.GET
+
+    def _read_body(self, test, response):
+        """Reads the body of the response if any of the response handlers
+        need it, up to the test's max_body_bytes. Otherwise, as the status
+        code is all the runner itself needs, only bodies of up to 
+        SCOUT_DRAIN_BODY_BYTES are read (and thrown away) so that the 
+        connection can go back to the pool; for larger ones, or those of
+        unknown length, it's closed without downloading them.
+        """
+        if self.needs_body:
+            limit = test.max_body_bytes
+        else:
+            limit = DRAIN_BODY_BYTES
+        length = self._get_content_length(test, response)
+        if limit is None or (length is not None and length <= limit):
+            # Reading the body in full lets the connection 
+            # go back to the pool.
+            response.content
+            return
+        try:
+            if self.needs_body:
+                response._content = response.raw.read(limit,
+                                                      decode_content=True)
+        finally:
+            response.close()
+
+    def _get_content_length(self, test, response):
+        """Returns the length of the response's body, if it's known.
+        """
+        if test.request_method == StatusTest.HEAD or \
+                response.status_code in (204, 304):
+            return 0
         try:
-            response = requests.get(test.url)
-        except URLError, e:
+            return int(response.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return None
+
+    def _process_result(self, result):
+        """Processes the result's response and adds it to the batch
+        for the batch response handlers.
+        """
+        self._process_response(result.test, result.response)
+        failure = None
+        if isinstance(result.response, CheckFailure):
+            failure = result.response.reason
+        elif result.response.status_code != result.test.expected_status:
+            failure = 'unexpected'
+        if failure is not None:
+            self._run_failures += 1
+        if self.metrics is not None:
+            self.metrics.count_check(failure)
+            if result.elapsed is not None:
+                self.metrics.observe('total', result.elapsed)
+        if not self.batch_response_handlers:
+            return
+        with self._batch_lock:
+            self._batch.append(result)
+            if BATCH_SIZE and len(self._batch) >= BATCH_SIZE:
+                self._run_batch_response_handlers()
+
+    def _process_response(self, test, response):
+        """Deals with the outcome of a single test once its 
+        response (or lack of) has been received.
+        """
+        self._record_uptime(test)
+        if isinstance(response, CheckFailure):
             # This is a hard error without even an HTTP response
             # and therefore should always be logged.
-            log.info('URL failed to provide a response. %s' % e)
-            self._log(test, response=False)
+            test_log = self._log(test, response)
+            self._update_project_status(test, test_log)
             return
+        handlers_start = time.time()
         self._run_response_handlers(test, response)
+        self._observe('handlers', time.time() - handlers_start)
         test_log = None
         if self._is_loggable(test, response):
             # Log the result and then update the
@@ -77,6 +539,70 @@ class PingRunner(object):
         self._update_project_status(test, test_log)
         return
 
+    def _run_batch_response_handlers(self):
+        """Hands the results collected so far to each of the batch
+        response handlers, then starts a new batch.
+        """
+        with self._batch_lock:
+            batch, self._batch = self._batch, []
+            if not batch:
+                return
+            for handler in self.batch_response_handlers:
+                try:
+                    handler.handle_results(batch)
+                except Exception:
+                    # The statuses are still to be saved, and matter more.
+                    transaction.rollback_unless_managed()
+                    log.exception('Batch response handler %s failed.' % 
+                                  handler.__class__.__name__)
+        return
+
+    def _get_last_logs(self, tests):
+        """Returns a dictionary mapping the pk of each of the tests to
+        its latest StatusChange, or None if it has never been logged.
+        This is normally denormalized on to the test as last_change,
+        tests without it (logged before it existed) are looked up from
+        their history, taking two queries per chunk of tests, and then
+        have it stored.
+        """
+        last_logs = {}
+        missing = {}
+        for test in tests:
+            if test.last_change_id is None:
+                missing[test.pk] = test
+                last_logs[test.pk] = None
+            else:
+                last_logs[test.pk] = test.last_change
+        for pks in chunked(missing.keys(), 500):
+            # Changes are only ever added, with date_added set on creation,
+            # so the highest pk per test is also the latest one.
+            latest = StatusChange.objects.filter(test__in=pks)\
+                                .values('test').annotate(latest=Max('pk'))
+            latest_pks = [row['latest'] for row in latest]
+            for status_log in StatusChange.objects.filter(pk__in=latest_pks):
+                last_logs[status_log.test_id] = status_log
+                test = missing[status_log.test_id]
+                test.last_change, test.last_result = \
+                                    status_log, status_log.result
+                self._set_last_change(status_log)
+        return last_logs
+
+    def _set_last_change(self, log):
+        """Stores the log as the latest for its test.
+        """
+        StatusTest.objects.filter(pk=log.test_id).update(last_change=log,
+                                                         last_result=log.result)
+
+    def _get_last_log(self, test):
+        """Returns the latest StatusChange for the test, from the 
+        state loaded for the run where possible.
+        """
+        try:
+            return self._last_logs[test.pk]
+        except KeyError:
+            self._last_logs.update(self._get_last_logs([test]))
+            return self._last_logs[test.pk]
+
     def _run_response_handlers(self, test, response):
         """Runs all the loaded response handlers against the
         response, this is for plugin-like functionality.
@@ -95,10 +621,8 @@ class PingRunner(object):
                the last time the Pinger ran it recorded a failure.
             3) If there has been no previous log.
         """
-        try:
-            last_log = StatusChange.objects.filter(test=test).\
-                                            order_by('-date_added')[0]
-        except IndexError:
+        last_log = self._get_last_log(test)
+        if last_log is None:
             # We don't have a log yet,
             # we should get one.
             return True
@@ -133,23 +657,119 @@ class PingRunner(object):
                                 else StatusChange.EXPECTED
         else:
             data['result'] = StatusChange.UNEXPECTED
+            data['failure'] = getattr(response, 'reason', 
+                                      StatusChange.FAILURE_CONNECTION)
+        start = time.time()
         log = StatusChange.objects.create(**data)
+        self._set_last_change(log)
+        test.last_change, test.last_result = log, log.result
+        self._last_logs[test.pk] = log
+        notify_change()
+        self._observe('writes', time.time() - start)
         return log
 
     def _update_project_status(self, test, log=None):
-        """Updates the date_updated timestamp on the project
-        so we know when it was last tested and stores a 
+        """Marks the test, and its project, as tested during this run;
+        they are then all saved together, once the run has finished, 
+        by _save_test_statuses and _save_project_statuses.
+        """
+        self._tested_tests[test.pk] = test
+        self._tested_projects.add(test.project_id)
+        return
+
+    def _record_uptime(self, test):
+        """Credits the time since the test was last checked to its uptime
+        or downtime, depending on the result it had over that time.
+        Gaps longer than SCOUT_UPTIME_MAX_GAP, or twice the interval the
+        test was checked at if that's longer, where the pinger can't 
+        have been running, aren't counted either way.
+        """
+        now = datetime.datetime.now()
+        since, test.last_checked = test.last_checked, now
+        if since is None or not test.last_result:
+            return
+        max_gap = max(UPTIME_MAX_GAP, 2 * get_check_interval(test, since))
+        if (now - since).total_seconds() > max_gap:
+            return
+        index = 1 if test.last_result == StatusChange.UNEXPECTED else 0
+        while since < now:
+            # Split the time at midnight.
+            day = since.date()
+            midnight = datetime.datetime.combine(
+                        day + datetime.timedelta(days=1), datetime.time())
+            until = min(now, midnight)
+            self._uptime[(test.pk, day)][index] += \
+                        (until - since).total_seconds()
+            since = until
+
+    def _save_uptime(self):
+        """Adds the uptime recorded during the run to the UptimeBuckets.
+        """
+        uptime, self._uptime = self._uptime, defaultdict(lambda: [0, 0])
+        for (pk, day), (up, down) in uptime.iteritems():
+            updated = UptimeBucket.objects.filter(test=pk, day=day).update(
+                            up_seconds=F('up_seconds') + up,
+                            down_seconds=F('down_seconds') + down)
+            if not updated:
+                UptimeBucket.objects.create(test_id=pk, day=day, 
+                                            up_seconds=up, down_seconds=down)
+        return
+
+    def _save_test_statuses(self):
+        """Updates the last_checked timestamp on each test run, and with
+        adaptive scheduling when it's next due; the tests are updated 
+        together in groups with the same check interval. Tests whose
+        responses changed their validators have those saved as well.
+        """
+        tests = self._tested_tests
+        self._tested_tests = {}
+        now = datetime.datetime.now()
+        for test in tests.values():
+            if getattr(test, 'validators_changed', False):
+                # Only as often as the pages change their validators.
+                StatusTest.objects.filter(pk=test.pk).update(
+                        etag=test.etag, last_modified=test.last_modified)
+                test.validators_changed = False
+        if not ADAPTIVE_SCHEDULING:
+            for pks in chunked(tests, 500):
+                StatusTest.objects.filter(pk__in=pks).update(
+                                                    last_checked=now)
+            return
+        # Counted from the start of the run, so a test checked every 
+        # minute is due again by the time cron next starts the pinger.
+        started = self._run_started or now
+        intervals = defaultdict(list)
+        for test in tests.values():
+            intervals[get_check_interval(test, now)].append(test)
+        for interval, interval_tests in intervals.items():
+            next_check = started + datetime.timedelta(seconds=interval)
+            for test in interval_tests:
+                test.next_check = next_check
+            for pks in chunked([test.pk for test in interval_tests], 500):
+                StatusTest.objects.filter(pk__in=pks).update(
+                                    last_checked=now, next_check=next_check)
+        return
+
+    def _save_project_statuses(self):
+        """Updates the date_updated timestamp on each project tested
+        in the run so we know when it was last tested and stores a 
         denormalized field on the project showing the current 
-        status, this method updates that field based on the 
-        logging occurring and whether it was an 
-        EXPECTED/UNEXPECTED result.
-        """
-        project = test.project
-        project.date_updated = datetime.datetime.now()
-        if not log is None:
-            if log.is_error():
-                project.working = False
-            else:
-                project.working = True
-        project.save()
+        status; a project is working only if none of its active
+        tests' latest logs are EXPECTED/UNEXPECTED errors.
+        """
+        project_pks = self._tested_projects
+        self._tested_projects = set()
+        failing = set()
+        for pks in chunked(project_pks, 500):
+            failing.update(StatusTest.active.filter(project__in=pks, 
+                                    last_result=StatusChange.UNEXPECTED)\
+                                .values_list('project', flat=True))
+        working = project_pks - failing
+        now = datetime.datetime.now()
+        for pks in chunked(working, 500):
+            Project.objects.filter(pk__in=pks).update(date_updated=now,
+                                                      working=True)
+        for pks in chunked(failing, 500):
+            Project.objects.filter(pk__in=pks).update(date_updated=now,
+                                                      working=False)
         return
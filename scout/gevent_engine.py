@@ -0,0 +1,86 @@
+"""An alternative to the threaded PingRunner which keeps all of its
+requests in flight from a single gevent event loop, for fleets of
+tests which spend nearly all of their time waiting on the network.
+
+The socket and ssl modules are patched when this module is imported
+so, for HTTPS tests especially, it should be imported before requests
+is; run_pinger takes care of that when the engine is selected via
+SCOUT_ENGINE or --engine.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from gevent import monkey
+    from gevent.pool import Pool
+    from gevent.threadpool import ThreadPool
+except ImportError, e:
+    raise ImproperlyConfigured("The gevent engine requires gevent: %s." % e)
+
+monkey.patch_socket()
+monkey.patch_ssl()
+
+from scout.engine import PingRunner, CheckResult, CheckFailure
+from scout.logger import log
+from scout.models import StatusChange
+from scout.settings import GEVENT_POOL_SIZE
+
+
+class GeventPingRunner(PingRunner):
+    """A PingRunner which makes each request from its own greenlet,
+    up to `workers` (SCOUT_GEVENT_POOL_SIZE by default) at once.
+
+    The database drivers are not cooperative so the processing of
+    each response, and with it every ORM write, is handed to a real
+    thread rather than being allowed to block the loop. Just the one,
+    as the runner's bookkeeping isn't safe to share between threads.
+    """
+
+    def __init__(self, response_handlers=False, workers=None,
+                 *args, **kwargs):
+        super(GeventPingRunner, self).__init__(
+                response_handlers, workers or GEVENT_POOL_SIZE, 
+                *args, **kwargs)
+
+    def _check_all(self, tests):
+        """Runs every test from the greenlet pool, each greenlet
+        waits on its own response being processed so the pool size 
+        also bounds how far the writes can fall behind. Tests whose
+        responses haven't arrived by the run deadline are killed
+        and logged as timeouts.
+        """
+        pool = Pool(self.workers)
+        executor = ThreadPool(1)
+        # Evaluate the queryset up front, from this thread.
+        tests = list(tests)
+        processed = set()
+
+        def check(test):
+            try:
+                result = self._fetch(test)
+            except Exception, e:
+                # As for the threaded engine, so one bad test can't 
+                # abort the run.
+                log.exception('Unhandled error testing URL: %s' % test.url)
+                result = CheckResult(test, CheckFailure(
+                            StatusChange.FAILURE_CONNECTION, e), None)
+            processed.add(test.pk)
+            try:
+                executor.spawn(self._process_result, result).get()
+            except Exception:
+                log.exception('Unhandled error processing URL: %s' % \
+                              test.url)
+
+        try:
+            for test in tests:
+                pool.spawn(check, test)
+            pool.join(timeout=self._time_remaining())
+            pool.kill()
+            for test in tests:
+                if test.pk not in processed:
+                    executor.spawn(self._process_result,
+                                   self._abandon(test)).get()
+            executor.join()
+        finally:
+            pool.kill()
+            executor.kill()
+        return
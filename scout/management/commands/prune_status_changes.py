@@ -0,0 +1,37 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scout.retention import prune_status_changes
+from scout.settings import RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    """
+    A management command to delete the old status change history.
+    """
+
+    help = ('Deletes the status changes older than the retention period, '
+            'keeping the latest change of every test.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--days', action='store', type='int', dest='days',
+                    default=None, help='The number of days of changes to '
+                    'keep, defaults to SCOUT_RETENTION_DAYS.'),
+        make_option('--chunk-size', action='store', type='int', 
+                    dest='chunk_size', default=None, help='The number of '
+                    'rows to delete at a time, defaults to '
+                    'SCOUT_RETENTION_CHUNK_SIZE.'),
+        make_option('--pause', action='store', type='float', dest='pause',
+                    default=0, help='Seconds to wait between chunks.'),
+    )
+
+    def handle(self, *args, **options):
+        days = options.get('days') or RETENTION_DAYS
+        if not days:
+            raise CommandError("Set --days or SCOUT_RETENTION_DAYS.")
+        removed, elapsed = prune_status_changes(days, 
+                                                options.get('chunk_size'),
+                                                options.get('pause'))
+        self.stdout.write("Removed %s status changes in %.2fs.\n" % (
+                            removed, elapsed))
@@ -1,10 +1,17 @@
+import signal
 from optparse import make_option
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from lockfile import FileLock, AlreadyLocked, LockTimeout
 
-from scout.engine import PingRunner
 from scout.logger import log
+from scout.scheduler import Scheduler
+from scout.retention import prune_status_changes
+from scout.settings import (ENGINE, SHARDING, RETENTION_DAYS, 
+                            RETENTION_INTERVAL)
+from scout.sharding import ShardCoordinator
+from scout.utils import get_module_from_module_string
 
 LOCK_WAIT_TIMEOUT = -1
 
@@ -16,11 +23,37 @@ class Command(BaseCommand):
     help = '#TODO'
 
     option_list = BaseCommand.option_list + (
+        make_option('--workers', action='store', type='int', dest='workers',
+                    default=None, help='The number of tests to run '
+                    'concurrently, defaults to SCOUT_MAX_WORKERS.'),
+        make_option('--engine', action='store', dest='engine', default=None,
+                    help='Dot-seperated path to the PingRunner class to '
+                    'use, defaults to SCOUT_ENGINE.'),
+        make_option('--deadline', action='store', type='float', 
+                    dest='deadline', default=None, help='The number of '
+                    'seconds after which unfinished tests are logged as '
+                    'timeouts, defaults to SCOUT_RUN_DEADLINE.'),
+        make_option('--daemon', action='store_true', dest='daemon',
+                    default=False, help='Stay running, testing each URL '
+                    'whenever it is next due rather than all of them once.'),
+        make_option('--shard', action='store_true', dest='shard',
+                    default=SHARDING, help='Share the tests with the other '
+                    'pinger nodes, defaults to SCOUT_SHARDING.'),
+        make_option('--node', action='store', dest='node', default=None,
+                    help='The name of this node when sharding, defaults to '
+                    'SCOUT_NODE_NAME or the hostname.'),
     )
 
     def handle(self, *args, **options):
+        shard = None
+        lock_name = "django_scout_run_pinger"
+        if options.get('shard'):
+            # The lock now only stops the same node running twice,
+            # it's the shard leases which divide up the work.
+            shard = ShardCoordinator(options.get('node'))
+            lock_name = "%s_%s" % (lock_name, shard.node_name)
         # Check the lock is free.
-        lock = FileLock("django_scout_run_pinger")
+        lock = FileLock(lock_name)
         log.info("Acquiring file lock..")
         try:
             lock.acquire(LOCK_WAIT_TIMEOUT)
@@ -34,8 +67,58 @@ class Command(BaseCommand):
 
         try:
             log.info("Starting the pinger..")
-            handler = PingRunner()
-            handler.run_tests()
+            # The engine is only imported here as some (gevent) need
+            # to patch the standard library before requests is loaded.
+            engine = get_module_from_module_string(
+                                options.get('engine') or ENGINE)
+            handler = engine(workers=options.get('workers'),
+                             deadline=options.get('deadline'), 
+                             shard=shard)
+            if options.get('daemon'):
+                self.run_daemon(handler)
+                if shard is not None:
+                    shard.leave()
+            else:
+                handler.run_tests()
+                if 'scout.notifications' in settings.INSTALLED_APPS:
+                    # Send what the run queued, so cron setups only 
+                    # need the one entry.
+                    self.dispatch_notifications()
         finally:
             lock.release()
             log.info("Released lock.")
+
+    def run_daemon(self, handler):
+        """Runs the tests via the scheduler until interrupted or
+        sent a SIGTERM.
+        """
+        scheduler = Scheduler(handler)
+        if RETENTION_DAYS:
+            scheduler.add_task(RETENTION_INTERVAL, prune_status_changes)
+        if 'scout.notifications' in settings.INSTALLED_APPS:
+            from scout.notifications.settings import NOTIFICATION_INTERVAL
+            scheduler.add_task(NOTIFICATION_INTERVAL, 
+                               self.dispatch_notifications)
+        signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+        log.info("Running as a daemon.")
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        log.info("Daemon stopped.")
+
+    def dispatch_notifications(self):
+        """Sends the queued notifications, unless dispatch_notifications
+        is already doing so.
+        """
+        from scout.notifications.dispatch import (dispatch_notifications,
+                                                  LOCK_NAME)
+        lock = FileLock(LOCK_NAME)
+        try:
+            lock.acquire(LOCK_WAIT_TIMEOUT)
+        except (AlreadyLocked, LockTimeout):
+            return
+        try:
+            dispatch_notifications()
+        finally:
+            lock.release()
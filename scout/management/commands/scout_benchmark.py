@@ -0,0 +1,135 @@
+import logging
+import os
+import shutil
+import tempfile
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import simplejson
+
+from scout.benchmark import start_stub_server, create_tests, run_benchmark
+from scout.logger import log
+from scout.settings import ENGINE
+from scout.utils import get_module_from_module_string
+
+
+class Command(BaseCommand):
+    """
+    A management command to benchmark the pinger.
+    """
+
+    help = ('Benchmarks the pinger against a local stub HTTP server, in a '
+            'test database, reporting its throughput and cost for each '
+            'number of tests.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--tests', action='store', dest='tests',
+                    default='100,1000', help='Comma seperated numbers of '
+                    'tests to benchmark, e.g. 100,1000,10000.'),
+        make_option('--runs', action='store', type='int', dest='runs',
+                    default=2, help='The number of runs over the tests; the '
+                    'first logs every test, later ones only the changes.'),
+        make_option('--workers', action='store', type='int', dest='workers',
+                    default=None, help='Defaults to SCOUT_MAX_WORKERS.'),
+        make_option('--engine', action='store', dest='engine', default=None,
+                    help='Defaults to SCOUT_ENGINE.'),
+        make_option('--latency', action='store', type='int', dest='latency',
+                    default=50, help='The mean response time of the stub '
+                    'server in milliseconds.'),
+        make_option('--size', action='store', type='int', dest='size',
+                    default=1024, help='The size of the response bodies.'),
+        make_option('--error-rate', action='store', type='float',
+                    dest='error_rate', default=0.05, help='The fraction of '
+                    'tests which get a 500.'),
+        make_option('--drop-rate', action='store', type='float',
+                    dest='drop_rate', default=0.01, help='The fraction of '
+                    'tests which get no response.'),
+        make_option('--seed', action='store', type='int', dest='seed',
+                    default=0),
+        make_option('--json', action='store_true', dest='json',
+                    default=False, help='Output the results as JSON.'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['tests'].split(',')]
+        except ValueError:
+            raise CommandError("Invalid --tests: %s" % options['tests'])
+        # The engine is only imported here as some (gevent) need
+        # to patch the standard library before requests is loaded.
+        engine = get_module_from_module_string(options.get('engine') or
+                                               ENGINE)
+        if int(options.get('verbosity', 1)) < 2:
+            log.setLevel(logging.WARNING)
+        server = start_stub_server()
+        base_url = 'http://%s:%s' % server.server_address
+        results = []
+        try:
+            for size in sizes:
+                results.extend(self.benchmark(engine, base_url, size,
+                                              options))
+        finally:
+            server.shutdown()
+        if options.get('json'):
+            self.stdout.write(simplejson.dumps(results, indent=2) + '\n')
+
+    def benchmark(self, engine, base_url, size, options):
+        """Benchmarks the number of tests given in a new test database.
+        """
+        old_name = settings.DATABASES['default']['NAME']
+        test_name = connection.settings_dict.get('TEST_NAME')
+        temp_dir = None
+        if connection.settings_dict['ENGINE'].endswith('sqlite3') and \
+                not test_name:
+            # An in-memory database can't be shared with the threads
+            # some engines save from.
+            temp_dir = tempfile.mkdtemp()
+            connection.settings_dict['TEST_NAME'] = os.path.join(
+                                                    temp_dir, 'scout.db')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        email_backend = settings.EMAIL_BACKEND
+        settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+        try:
+            create_tests(base_url, size, latency=options['latency'],
+                         size=options['size'],
+                         error_rate=options['error_rate'],
+                         drop_rate=options['drop_rate'],
+                         seed=options['seed'])
+            runner = engine(workers=options.get('workers'))
+            # The metrics are kept in the shared cache, where they'd be
+            # mixed in with those of the real pinger.
+            runner.metrics = None
+            dispatch = None
+            if 'scout.notifications' in settings.INSTALLED_APPS:
+                from scout.notifications.dispatch import dispatch_notifications
+                dispatch = dispatch_notifications
+            results = []
+            for run in range(1, options['runs'] + 1):
+                result = run_benchmark(runner, dispatch)
+                result.update({'run': run, 'workers': runner.workers,
+                               'engine': '%s.%s' % (engine.__module__,
+                                                    engine.__name__)})
+                results.append(result)
+                if not options.get('json'):
+                    self.report(result)
+            return results
+        finally:
+            settings.EMAIL_BACKEND = email_backend
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if temp_dir is not None:
+                connection.settings_dict['TEST_NAME'] = test_name
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def report(self, result):
+        self.stdout.write(
+            "%(tests)s tests, run %(run)s: %(seconds).2fs, "
+            "%(checks_per_second).1f checks/s, %(queries_per_check).2f "
+            "queries/check, %(changes)s changes, peak RSS "
+            "%(peak_rss_mb).1fMB\n" % result)
+        if 'notifications' in result:
+            self.stdout.write(
+                "    %(notifications)s notifications dispatched in "
+                "%(notification_seconds).2fs with %(notification_queries)s "
+                "queries\n" % result)
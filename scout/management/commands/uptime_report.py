@@ -0,0 +1,84 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from scout.models import Project, UptimeBucket
+
+
+class Command(BaseCommand):
+    """
+    A management command to report the uptime of each client and project.
+    """
+
+    help = ('Reports the uptime percentage of each client and project '
+            'between two dates, or over a month.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--start', action='store', dest='start', default=None,
+                    help='The first day to report on (YYYY-MM-DD).'),
+        make_option('--end', action='store', dest='end', default=None,
+                    help='The last day to report on (YYYY-MM-DD), '
+                    'defaults to today.'),
+        make_option('--month', action='store', dest='month', default=None,
+                    help='The month to report on (YYYY-MM), used instead of '
+                    '--start and --end. Defaults to the current month.'),
+    )
+
+    def parse_date(self, value, format):
+        try:
+            return datetime.datetime.strptime(value, format).date()
+        except ValueError:
+            raise CommandError("Invalid date: %s" % value)
+
+    def get_range(self, options):
+        """Returns the (start, end) dates to report on.
+        """
+        today = datetime.date.today()
+        if options.get('start'):
+            start = self.parse_date(options['start'], '%Y-%m-%d')
+            end = today
+            if options.get('end'):
+                end = self.parse_date(options['end'], '%Y-%m-%d')
+            return start, end
+        if options.get('month'):
+            start = self.parse_date(options['month'], '%Y-%m')
+        else:
+            start = today.replace(day=1)
+        next_month = (start + datetime.timedelta(days=32)).replace(day=1)
+        return start, next_month - datetime.timedelta(days=1)
+
+    def get_uptimes(self, buckets, field):
+        """Returns a dictionary mapping the pks of the objects referenced
+        by `field` to their uptime percentage over the buckets.
+        """
+        uptimes = {}
+        for row in buckets.values(field).annotate(up=Sum('up_seconds'),
+                                                  down=Sum('down_seconds')):
+            total = row['up'] + row['down']
+            if total:
+                uptimes[row[field]] = 100.0 * row['up'] / total
+        return uptimes
+
+    def format_uptime(self, uptime):
+        if uptime is None:
+            return 'no data'
+        return '%.3f%%' % uptime
+
+    def handle(self, *args, **options):
+        start, end = self.get_range(options)
+        buckets = UptimeBucket.objects.filter(day__gte=start, day__lte=end)
+        client_uptimes = self.get_uptimes(buckets, 'test__project__client')
+        project_uptimes = self.get_uptimes(buckets, 'test__project')
+        self.stdout.write("Uptime from %s to %s\n" % (start, end))
+        projects = Project.objects.select_related('client')\
+                                  .order_by('client__name', 'name')
+        client = None
+        for project in projects:
+            if project.client != client:
+                client = project.client
+                self.stdout.write("\n%s: %s\n" % (client.name, 
+                        self.format_uptime(client_uptimes.get(client.pk))))
+            self.stdout.write("    %s: %s\n" % (project.name, 
+                        self.format_uptime(project_uptimes.get(project.pk))))
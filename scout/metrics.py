@@ -0,0 +1,159 @@
+"""Timings and counts of the pinger's work, kept in the cache so that
+the pinger (or several of them) can add to them and the metrics view
+can export them in the Prometheus text format.
+
+Each check is timed in phases: `dns` (the lookup, when the DNS cache
+is in use), `ttfb` (up to the response headers, so including connect,
+TLS and the server's time as requests doesn't time those separately),
+`body`, `handlers` (the response handlers), `writes` (logging a status
+change) and `total`. A runner collects these in memory over a run and
+then adds them to the cached histograms in one go, with cache.incr so
+concurrent pingers don't overwrite each other.
+
+The cache has to be one shared between processes (memcached, the
+database or the filesystem) for the counts to get from the pinger to
+the web server; with the local memory or dummy caches the pinger
+doesn't record them and the view answers with a 503.
+"""
+import bisect
+import threading
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from scout.models import StatusChange
+
+PHASES = ('dns', 'ttfb', 'body', 'handlers', 'writes', 'total')
+# The upper bounds of the histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+FAILURE_REASONS = [reason for reason, name in StatusChange.FAILURE_CHOICES]
+FAILURE_REASONS.append('unexpected')
+GAUGES = ('last_run_timestamp_seconds', 'last_run_duration_seconds',
+          'last_run_tests', 'last_run_failures', 'last_run_queue_lag_seconds',
+          'last_run_save_seconds')
+
+KEY_PREFIX = 'scout:metrics:'
+# Long enough that they will normally only be evicted, not expire.
+TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _bucket_key(phase, bucket):
+    return '%sphase:%s:%s' % (KEY_PREFIX, phase, bucket)
+
+
+def _sum_key(phase):
+    # Kept in microseconds, as cache.incr only takes integers.
+    return '%sphase:%s:sum' % (KEY_PREFIX, phase)
+
+
+def _failures_key(reason):
+    return '%sfailures:%s' % (KEY_PREFIX, reason)
+
+
+def _gauge_key(name):
+    return '%sgauge:%s' % (KEY_PREFIX, name)
+
+
+CHECKS_KEY = KEY_PREFIX + 'checks'
+
+
+def is_cache_shared():
+    """Returns True if the cache can carry the metrics between processes.
+    """
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Not in the cache yet, unless another process just added it.
+        if not cache.add(key, delta, TIMEOUT):
+            cache.incr(key, delta)
+
+
+class MetricsRecorder(object):
+    """Collects the timings and counts of checks, from any thread,
+    until they're flushed to the cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+
+    def observe(self, phase, seconds):
+        """Records that the phase of a check took `seconds`.
+        """
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self._counts[_bucket_key(phase, bucket)] += 1
+            self._counts[_sum_key(phase)] += int(seconds * 1000000)
+
+    def count_check(self, failure=None):
+        """Records a check, along with its failure reason if it failed.
+        """
+        with self._lock:
+            self._counts[CHECKS_KEY] += 1
+            if failure is not None:
+                self._counts[_failures_key(failure)] += 1
+
+    def flush(self):
+        """Adds everything recorded so far to the totals in the cache.
+        """
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(int)
+        for key, delta in counts.items():
+            _incr(key, delta)
+
+
+def set_gauges(**gauges):
+    """Sets the run-level gauges, named as in GAUGES.
+    """
+    cache.set_many(dict((_gauge_key(name), value)
+                        for name, value in gauges.items()), TIMEOUT)
+
+
+def render_metrics():
+    """Returns the metrics in the Prometheus text exposition format.
+    """
+    keys = [CHECKS_KEY] + [_failures_key(reason)
+                           for reason in FAILURE_REASONS] + \
+           [_gauge_key(name) for name in GAUGES]
+    for phase in PHASES:
+        keys.append(_sum_key(phase))
+        keys.extend(_bucket_key(phase, bucket)
+                    for bucket in range(len(BUCKETS) + 1))
+    values = cache.get_many(keys)
+    lines = [
+        '# HELP scout_checks_total The number of checks made.',
+        '# TYPE scout_checks_total counter',
+        'scout_checks_total %s' % values.get(CHECKS_KEY, 0),
+        '# HELP scout_check_failures_total The number of failed checks.',
+        '# TYPE scout_check_failures_total counter',
+    ]
+    for reason in FAILURE_REASONS:
+        lines.append('scout_check_failures_total{reason="%s"} %s' % (
+                        reason, values.get(_failures_key(reason), 0)))
+    lines.extend([
+        '# HELP scout_check_phase_seconds The time taken by each phase '
+        'of a check.',
+        '# TYPE scout_check_phase_seconds histogram',
+    ])
+    for phase in PHASES:
+        count = 0
+        for bucket, bound in enumerate(BUCKETS + ('+Inf',)):
+            count += values.get(_bucket_key(phase, bucket), 0)
+            lines.append('scout_check_phase_seconds_bucket{phase="%s",'
+                         'le="%s"} %s' % (phase, bound, count))
+        lines.append('scout_check_phase_seconds_sum{phase="%s"} %s' % (
+                        phase, values.get(_sum_key(phase), 0) / 1000000.0))
+        lines.append('scout_check_phase_seconds_count{phase="%s"} %s' % (
+                        phase, count))
+    for name in GAUGES:
+        value = values.get(_gauge_key(name))
+        if value is not None:
+            lines.append('# TYPE scout_%s gauge' % name)
+            lines.append('scout_%s %s' % (name, value))
+    return '\n'.join(lines) + '\n'
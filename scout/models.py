@@ -1,3 +1,6 @@
+import bisect
+import datetime
+
 from django.db import models
 from django.template.defaultfilters import slugify
 from django.utils.translation import ugettext_lazy as _
@@ -34,6 +37,21 @@ class ActiveModel(models.Model):
     class Meta:
         abstract = True
 
+###
+# Helpers
+###
+
+def get_uptime(buckets):
+    """Returns the percentage of the time recorded in the queryset of
+    UptimeBuckets that was spent up, or None if there's none recorded.
+    """
+    totals = buckets.aggregate(up=models.Sum('up_seconds'),
+                               down=models.Sum('down_seconds'))
+    up, down = totals['up'] or 0, totals['down'] or 0
+    if not up + down:
+        return None
+    return 100.0 * up / (up + down)
+
 ###
 # Actual Models
 ###
@@ -60,6 +78,14 @@ class Client(TimestampModel, ActiveModel):
             self.slug = slugify(self.name)
         super(Client, self).save(*args, **kwargs)
 
+    def get_uptime(self, start, end):
+        """Returns the uptime percentage across all of the client's 
+        tests between the two dates (inclusive).
+        """
+        return get_uptime(UptimeBucket.objects.filter(
+                            test__project__client=self,
+                            day__gte=start, day__lte=end))
+
 
 class Project(TimestampModel, ActiveModel):
     """
@@ -86,6 +112,13 @@ class Project(TimestampModel, ActiveModel):
             self.slug = slugify(self.name)
         super(Project, self).save(*args, **kwargs)
 
+    def get_uptime(self, start, end):
+        """Returns the uptime percentage across all of the project's 
+        tests between the two dates (inclusive).
+        """
+        return get_uptime(UptimeBucket.objects.filter(test__project=self,
+                            day__gte=start, day__lte=end))
+
     def last_log(self):
         """Returns the latest StatusChange for any test
         underneath this project. Caches state.
@@ -93,8 +126,12 @@ class Project(TimestampModel, ActiveModel):
         if hasattr(self, '_last_log'):
             return self._last_log
         else:   
+            # Only the latest change of each test can be the 
+            # project's latest, so there's no need to go through
+            # the whole of the history.
             try:
-                status_log = StatusChange.objects.filter(test__project=self)\
+                status_log = StatusChange.objects.filter(
+                                pk__in=self.tests.values('last_change'))\
                                 .order_by('-date_added')[0]
             except IndexError:
                 status_log = None
@@ -109,11 +146,52 @@ class StatusTest(TimestampModel, ActiveModel):
     more granular.
     """
 
+    GET = 'GET'
+    HEAD = 'HEAD'
+    METHOD_CHOICES = (
+        (GET, 'GET'),
+        (HEAD, 'HEAD'),
+    )
+
     project = models.ForeignKey('scout.Project', related_name='tests')
     url = models.URLField(max_length=255, verify_exists=False) 
+    request_method = models.CharField(max_length=4, choices=METHOD_CHOICES,
+                default=GET, help_text="HEAD avoids the response body "
+                                       "altogether, if the site supports it.")
+    max_body_bytes = models.PositiveIntegerField(blank=True, null=True,
+                help_text="The most of the response body to download for "
+                          "the response handlers which need it, leave blank "
+                          "for no limit.")
     expected_status = models.SmallIntegerField(choices=HTTP_STATUS_CODES)
     display_order = models.SmallIntegerField(blank=True, null=True, 
                 help_text="Used to define order of display.")
+    connect_timeout = models.FloatField(blank=True, null=True,
+                help_text="Seconds to wait for a connection, leave blank "
+                          "to use the default.")
+    read_timeout = models.FloatField(blank=True, null=True,
+                help_text="Seconds to wait for the response, leave blank "
+                          "to use the default.")
+    # The current state of the test, denormalized by the 
+    # PingRunner so it doesn't have to be read from the history.
+    last_change = models.ForeignKey('scout.StatusChange', null=True, 
+                                    blank=True, editable=False,
+                                    related_name='+',
+                                    on_delete=models.SET_NULL)
+    # Mirrors last_change.result, for filtering on.
+    last_result = models.CharField(max_length=3, blank=True, editable=False)
+    last_checked = models.DateTimeField(null=True, blank=True, 
+                                        editable=False)
+    check_interval = models.PositiveIntegerField(blank=True, null=True,
+                help_text="Seconds between runs of the test when the pinger "
+                          "is run as a daemon, leave blank to use the "
+                          "default.")
+    # When the test is next due, with SCOUT_ADAPTIVE_SCHEDULING.
+    next_check = models.DateTimeField(null=True, blank=True, editable=False,
+                                      db_index=True)
+    # The validators of the last full response, for conditional requests.
+    etag = models.CharField(max_length=255, blank=True, editable=False)
+    last_modified = models.CharField(max_length=255, blank=True, 
+                                     editable=False)
 
     objects = models.Manager()
     active = StatusTestActiveManager()
@@ -124,19 +202,27 @@ class StatusTest(TimestampModel, ActiveModel):
     def __unicode__(self):
         return u"Test: %s" % self.url
 
+    def get_uptime(self, start, end):
+        """Returns the test's uptime percentage between the 
+        two dates (inclusive).
+        """
+        return get_uptime(self.uptime.filter(day__gte=start, day__lte=end))
+
+    def get_response_times(self, start, end=None):
+        """Returns a single ResponseTimeRollup summarising the response
+        times recorded between the two datetimes.
+        """
+        rollups = self.response_times.filter(period_start__gte=start)
+        if end is not None:
+            rollups = rollups.filter(period_start__lt=end)
+        return ResponseTimeRollup.merge(rollups)
+
     def last_log(self):
         """Returns the latest StatusChange for this test,
-        if available - else None. Caches state.
+        if available - else None. This is kept denormalized 
+        on the test, as last_change, by the PingRunner.
         """
-        if hasattr(self, '_last_log'):
-            return self._last_log
-        else:   
-            try:
-                status_log = self.status_changes.all().order_by('-date_added')[0]
-            except IndexError:
-                status_log = None
-        self._last_log = status_log
-        return self._last_log
+        return self.last_change
 
 
 class StatusChange(models.Model):
@@ -151,6 +237,14 @@ class StatusChange(models.Model):
         (EXPECTED, _('Expected')),        
         (UNEXPECTED, _('Unexpected')),        
     )
+    FAILURE_CONNECTION = 'connection'
+    FAILURE_TIMEOUT = 'timeout'
+    FAILURE_DNS = 'dns'
+    FAILURE_CHOICES = (
+        (FAILURE_DNS, _('DNS lookup failed')),
+        (FAILURE_CONNECTION, _('Connection failed')),
+        (FAILURE_TIMEOUT, _('Timed out')),
+    )
 
     test = models.ForeignKey('scout.StatusTest', 
                              related_name='status_changes')
@@ -163,9 +257,14 @@ class StatusChange(models.Model):
     returned_status = models.PositiveSmallIntegerField(
                         choices=HTTP_STATUS_CODES, null=True, blank=True)
     result = models.CharField(max_length=3, choices=STATUS_CHOICES)
+    # Why no response was returned, blank if there was one.
+    failure = models.CharField(max_length=10, choices=FAILURE_CHOICES,
+                               blank=True)
     # Don't need date updated so we keep things lean here 
     # by not subclassing the Timestamp abstract model.
-    date_added = models.DateTimeField(auto_now_add=True)
+    # There's also a composite (test, date_added) index,
+    # see sql/statuschange.sql.
+    date_added = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ['-date_added']
@@ -183,3 +282,167 @@ class StatusChange(models.Model):
             return True
         return False
 
+
+
+class PingerNode(models.Model):
+    """A pinger process taking part in a sharded run; each node holds
+    a lease, renewed on every heartbeat, and the active tests are split
+    between the nodes whose leases haven't expired.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    last_seen = models.DateTimeField()
+
+    def __unicode__(self):
+        return self.name
+
+
+class ResponseTimeRollup(models.Model):
+    """Rolls up the response times of a test over a period (an hour by
+    default) so that they can be kept without storing every check; the 
+    percentiles are approximated from a histogram of the times.
+    """
+    # The upper bounds, in milliseconds, of the histogram buckets;
+    # anything slower goes in a final overflow bucket.
+    BUCKETS = (10, 25, 50, 75, 100, 150, 200, 300, 400, 500, 750, 1000,
+               1500, 2000, 3000, 5000, 7500, 10000, 15000, 30000)
+
+    test = models.ForeignKey('scout.StatusTest', 
+                             related_name='response_times')
+    period_start = models.DateTimeField()
+    # The length of the period in seconds.
+    period_length = models.PositiveIntegerField()
+    # The times are all stored in milliseconds.
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    minimum = models.FloatField(null=True, blank=True)
+    maximum = models.FloatField(null=True, blank=True)
+    # Time to first byte, for the checks where it was available.
+    ttfb_count = models.PositiveIntegerField(default=0)
+    ttfb_total = models.FloatField(default=0)
+    histogram = models.CommaSeparatedIntegerField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['-period_start']
+        unique_together = ('test', 'period_length', 'period_start')
+
+    def __unicode__(self):
+        return u"Response times for %s from %s" % (self.test_id, 
+                                                   self.period_start)
+
+    @classmethod
+    def get_period_start(cls, when, period_length):
+        """Returns the start of the period of the given length, in 
+        seconds, which the datetime falls into.
+        """
+        midnight = when.replace(hour=0, minute=0, second=0, microsecond=0)
+        seconds = (when - midnight).seconds
+        return midnight + datetime.timedelta(
+                    seconds=seconds - seconds % period_length)
+
+    @classmethod
+    def merge(cls, rollups):
+        """Returns a new, unsaved, rollup combining those given; for
+        example to summarise the response times over a day.
+        """
+        merged = cls()
+        for rollup in rollups:
+            merged.add_rollup(rollup)
+        return merged
+
+    def get_counts(self):
+        """Returns the histogram as a list of counts, one per bucket.
+        """
+        if not self.histogram:
+            return [0] * (len(self.BUCKETS) + 1)
+        return [int(count) for count in self.histogram.split(',')]
+
+    def add(self, elapsed, ttfb=None):
+        """Records a single response time (and optionally its time to
+        first byte), both in milliseconds.
+        """
+        counts = self.get_counts()
+        counts[bisect.bisect_left(self.BUCKETS, elapsed)] += 1
+        self.histogram = ','.join(str(count) for count in counts)
+        self.count += 1
+        self.total += elapsed
+        self.minimum = elapsed if self.minimum is None \
+                        else min(self.minimum, elapsed)
+        self.maximum = elapsed if self.maximum is None \
+                        else max(self.maximum, elapsed)
+        if ttfb is not None:
+            self.ttfb_count += 1
+            self.ttfb_total += ttfb
+
+    def add_rollup(self, rollup):
+        """Adds the response times recorded by another rollup to this one.
+        """
+        if not rollup.count:
+            return
+        self.histogram = ','.join(str(a + b) for a, b in 
+                            zip(self.get_counts(), rollup.get_counts()))
+        self.count += rollup.count
+        self.total += rollup.total
+        self.minimum = rollup.minimum if self.minimum is None \
+                        else min(self.minimum, rollup.minimum)
+        self.maximum = rollup.maximum if self.maximum is None \
+                        else max(self.maximum, rollup.maximum)
+        self.ttfb_count += rollup.ttfb_count
+        self.ttfb_total += rollup.ttfb_total
+
+    @property
+    def mean(self):
+        if self.count:
+            return self.total / self.count
+        return None
+
+    @property
+    def ttfb_mean(self):
+        if self.ttfb_count:
+            return self.ttfb_total / self.ttfb_count
+        return None
+
+    def percentile(self, percent):
+        """Returns an approximation of the given percentile; the upper
+        bound of the bucket it falls in, clamped to the slowest time.
+        """
+        if not self.count:
+            return None
+        rank = self.count * percent / 100.0
+        seen = 0
+        for bucket, count in enumerate(self.get_counts()):
+            seen += count
+            if seen >= rank and count:
+                if bucket == len(self.BUCKETS):
+                    return self.maximum
+                return min(self.BUCKETS[bucket], self.maximum)
+        return self.maximum
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p95(self):
+        return self.percentile(95)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+
+class UptimeBucket(models.Model):
+    """The number of seconds a test spent up, and down, over a day; 
+    these are added to by the PingRunner as it runs the test so the 
+    uptime over any range of days is just a sum over the buckets.
+    """
+    test = models.ForeignKey('scout.StatusTest', related_name='uptime')
+    day = models.DateField()
+    up_seconds = models.FloatField(default=0)
+    down_seconds = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = ('test', 'day')
+
+    def __unicode__(self):
+        return u"Uptime for %s on %s" % (self.test_id, self.day)
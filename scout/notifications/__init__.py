@@ -1,28 +1,39 @@
 """Here we check the settings for the handlers we need to load in
 and attach to the post_save signal for when a StatusChange gets saved.
+
+Queued handlers aren't called from the signal themselves, it just adds
+the change to the outbox for each of them and dispatch_notifications 
+delivers them later (see scout.notifications.dispatch).
 """
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 
 from scout.models import StatusChange
 from scout.notifications.settings import NOTIFICATION_HANDLERS
-from scout.notifications.signals import create_notification_profile
+from scout.notifications.signals import (create_notification_profile,
+                                         queue_notifications)
 from scout.utils import get_module_from_module_string
 
-handler_classes = []
+# The handler instances, keyed by the path they're configured with.
+handler_instances = {}
 
-# First we load in all the classes specified in the
-# settings (without instantiating them).
+# First we load in all the classes specified in the settings.
 for handler_string in NOTIFICATION_HANDLERS:
-    handler_classes.append(get_module_from_module_string(handler_string))
+    handler_instances[handler_string] = \
+            get_module_from_module_string(handler_string)()
+
+# Then we connect the as_signal method of the handlers which 
+# aren't queued to the post_save.
+for handler_string, handler in handler_instances.items():
+    if not handler.queued:
+        post_save.connect(handler.as_signal, sender=StatusChange, 
+                          weak=False, 
+                          dispatch_uid='scout.notifications.handlers.%s' % \
+                                  handler.__class__.__name__)
 
-# Then we iterate over the classes and connect 
-# their as_signal method to the post_save.
-for handler in handler_classes:
-    instance = handler()
-    post_save.connect(instance.as_signal, sender=StatusChange, weak=False,
-                      dispatch_uid='scout.notifications.handlers.%s' % \
-                              handler.__name__)
+# And the one which queues the changes for the rest.
+post_save.connect(queue_notifications, sender=StatusChange,
+      dispatch_uid='scout.notifications.signals.queue_notifications')
 
 # Connect the handler which attaches a notification
 # profile to a django.auth user on creation.
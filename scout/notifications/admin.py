@@ -1,9 +1,17 @@
 from django.contrib import admin
 
-from scout.notifications.models import NotificationProfile
+from scout.notifications.models import NotificationProfile, Notification
 
 
 class NotificationProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'notification_email', 'mobile_number']
 
+
+class NotificationAdmin(admin.ModelAdmin):
+    date_heirarchy = 'date_added'
+    list_display = ['change', 'handler', 'date_added', 'attempts', 
+                    'next_attempt', 'date_sent']
+    list_filter = ['handler']
+
 admin.site.register(NotificationProfile, NotificationProfileAdmin)
+admin.site.register(Notification, NotificationAdmin)
@@ -0,0 +1,139 @@
+import datetime
+import traceback
+from collections import defaultdict
+
+from django.core.mail import get_connection
+from django.db.models import F
+
+from scout.logger import log
+from scout.models import StatusChange
+from scout.notifications.models import Notification
+from scout.notifications.settings import (NOTIFICATION_RETRY_DELAY, 
+                                          NOTIFICATION_MAX_RETRY_DELAY,
+                                          NOTIFICATION_MAX_ATTEMPTS)
+from scout.utils import chunked, get_module_from_module_string
+
+# The file lock held while dispatching, so that overlapping dispatchers 
+# (from cron, or run as daemons) can't send a notification twice.
+LOCK_NAME = "django_scout_dispatch_notifications"
+
+
+def get_retry_delay(attempts):
+    """Returns the number of seconds to wait before the next attempt,
+    doubling with each failed one.
+    """
+    return min(NOTIFICATION_RETRY_DELAY * 2 ** (attempts - 1),
+               NOTIFICATION_MAX_RETRY_DELAY)
+
+
+def get_handler(handler_string):
+    """Returns the configured instance of the handler, or a new one if 
+    it's since been taken out of SCOUT_NOTIFICATION_HANDLERS.
+    """
+    from scout.notifications import handler_instances
+    if handler_string not in handler_instances:
+        handler_instances[handler_string] = \
+                get_module_from_module_string(handler_string)()
+    return handler_instances[handler_string]
+
+
+def get_due_notifications():
+    """Returns the unsent notifications which are due an attempt, 
+    along with any others for the same handlers which have not been
+    tried yet so that they go out in the same digest.
+    """
+    unsent = Notification.objects.filter(
+                        date_sent__isnull=True,
+                        attempts__lt=NOTIFICATION_MAX_ATTEMPTS)\
+                    .select_related('change__test__project__client')
+    due = unsent.filter(next_attempt__lte=datetime.datetime.now())
+    handlers = set(due.values_list('handler', flat=True))
+    if not handlers:
+        return []
+    return list(due) + list(unsent.filter(handler__in=handlers, 
+                                          attempts=0)\
+                            .exclude(pk__in=due.values('pk')))
+
+
+def record_result(notifications, error=None):
+    """Marks the notifications as sent or, if given the error they
+    failed with, schedules their next attempt.
+    """
+    now = datetime.datetime.now()
+    if error is None:
+        # A whole digest is marked as sent at once.
+        for pks in chunked([notification.pk 
+                            for notification in notifications], 500):
+            Notification.objects.filter(pk__in=pks).update(
+                    date_sent=now, last_error='', 
+                    attempts=F('attempts') + 1)
+        return
+    for notification in notifications:
+        notification.attempts += 1
+        notification.last_error = traceback.format_exc()
+        notification.next_attempt = now + datetime.timedelta(
+                seconds=get_retry_delay(notification.attempts))
+        if notification.attempts >= NOTIFICATION_MAX_ATTEMPTS:
+            log.error("Giving up on %s after %s attempts: %s" % (
+                        notification, notification.attempts, error))
+        else:
+            log.warn("Failed to send %s, retrying at %s: %s" % (
+                        notification, notification.next_attempt, error))
+        notification.save()
+
+
+def send_notifications(handler_string, notifications, connection=None):
+    """Delivers the notifications through their handler, in a single
+    digest if it supports them; returns the number sent.
+    """
+    handler = get_handler(handler_string)
+    if handler.digest:
+        batches = [notifications]
+    else:
+        batches = [[notification] for notification in notifications]
+    sent = 0
+    for batch in batches:
+        try:
+            if handler.digest:
+                handler.send_digest([notification.change 
+                                     for notification in batch],
+                                    connection=connection)
+            else:
+                handler.as_signal(sender=StatusChange, 
+                                  instance=batch[0].change, created=True,
+                                  using=batch[0]._state.db)
+        except Exception, e:
+            record_result(batch, e)
+        else:
+            record_result(batch)
+            sent += len(batch)
+    return sent
+
+
+def dispatch_notifications():
+    """Sends every notification in the outbox which is due, the email
+    ones over a single mail connection; returns a two element tuple of 
+    the number sent and the number which failed.
+    """
+    notifications = defaultdict(list)
+    for notification in get_due_notifications():
+        notifications[notification.handler].append(notification)
+    if not notifications:
+        return 0, 0
+    connection = get_connection()
+    sent = total = 0
+    try:
+        # Otherwise each email opens and closes a connection of its own.
+        connection.open()
+    except Exception, e:
+        # Each send will try again, and record its failure.
+        log.warn("Failed to open the mail connection: %s" % e)
+    try:
+        for handler_string, pending in notifications.items():
+            pending.sort(key=lambda notification: notification.change_id)
+            sent += send_notifications(handler_string, pending, connection)
+            total += len(pending)
+    finally:
+        connection.close()
+    log.info("Sent %s notifications, %s failed." % (sent, total - sent))
+    return sent, total - sent
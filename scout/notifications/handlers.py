@@ -10,7 +10,14 @@ from scout.notifications.settings import FROM_EMAIL
 class BaseNotificationHandler(object):
     """The base notication handler response, all new handlers 
     should subclass this and extend/override from there.
+
+    Queued handlers are called from the notification outbox by the
+    dispatcher, others straight from the StatusChange post_save so
+    should be quick. Queued handlers which set `digest` are handed 
+    all the changes waiting for them at once, through send_digest.
     """
+    queued = True
+    digest = False
 
     def as_signal(self, sender, instance, created, using, **kwargs):
         """This is the method which gets connected to the 
@@ -18,6 +25,11 @@ class BaseNotificationHandler(object):
         """
         raise NotImplementedError
 
+    def send_digest(self, changes, connection=None):
+        """Should notify of all the given StatusChanges together.
+        """
+        raise NotImplementedError
+
 
 class LoggingNotificationHandler(BaseNotificationHandler):
     """A notificaion handler which uses the Python logging
@@ -25,6 +37,7 @@ class LoggingNotificationHandler(BaseNotificationHandler):
     up in the Django settings.py (1.3+) and redirected to 
     something like Sentry for example.
     """
+    queued = False
 
     def as_signal(self, sender, instance, created, using, **kwargs):
         if created:
@@ -42,7 +55,11 @@ class LoggingNotificationHandler(BaseNotificationHandler):
 class EmailNotificationHandler(BaseNotificationHandler):
     """This is the base class for the email handlers and
     as such should not be used directly without subclassing.
+
+    The queued changes are sent as a single digest email, over 
+    the mail connection the dispatcher shares between handlers.
     """
+    digest = True
 
     def _get_emails(self):
         """Should return an iterative of email addresses.
@@ -57,30 +74,73 @@ class EmailNotificationHandler(BaseNotificationHandler):
         return ('scout/notifications/email/unexpected.txt',
                 'scout/notifications/email/expected.txt')
 
-    def send_emails(self, subject, rendered_template, emails): 
+    def _get_digest_template(self):
+        return 'scout/notifications/email/digest.txt'
+
+    def send_emails(self, subject, rendered_template, emails, 
+                    connection=None): 
         """Should, given a list of emails and a rendered
         template, dispatch an email to those that need it.
         """
-        send_mail(subject, rendered_template, FROM_EMAIL, emails)
+        send_mail(subject, rendered_template, FROM_EMAIL, emails,
+                  connection=connection)
+
+    def render(self, instance):
+        """Returns the subject and body of the email for a single
+        StatusChange.
+        """
+        subject = u"%s " % settings.EMAIL_SUBJECT_PREFIX
+        context = {'log': instance}
+        error_template, recovery_template = self._get_templates()
+        if instance.is_error():
+            template = error_template
+            subject = string_concat(subject, _("PROBLEM: "))
+        else:
+            template = recovery_template 
+            subject = string_concat(subject, _("RECOVERED: "))
+        subject += u"%s - %s" % (instance.test.project.client.name,
+                              instance.test.project.name)
+        return subject, render_to_string(template, context)
+
+    def render_digest(self, changes):
+        """Returns the subject and body of the email for several 
+        StatusChanges, listing the problems and then the recoveries.
+        """
+        problems = [change for change in changes if change.is_error()]
+        recoveries = [change for change in changes 
+                      if not change.is_error()]
+        subject = _("%(problems)s PROBLEMS, %(recoveries)s RECOVERED: "
+                    "%(projects)s") % {
+            'problems': len(problems),
+            'recoveries': len(recoveries),
+            'projects': u", ".join(sorted(set(
+                                u"%s - %s" % (change.test.project.client.name,
+                                             change.test.project.name)
+                                for change in changes))),
+        }
+        subject = u"%s %s" % (settings.EMAIL_SUBJECT_PREFIX, subject)
+        rendered = render_to_string(self._get_digest_template(), 
+                                    {'problems': problems,
+                                     'recoveries': recoveries})
+        return subject, rendered
 
     def as_signal(self, sender, instance, created, using, **kwargs):
         """The signal connector.
         """
         if created:
-            subject = u"%s " % settings.EMAIL_SUBJECT_PREFIX
-            context = {'log': instance}
-            error_template, recovery_template = self._get_templates()
-            if instance.is_error():
-                template = error_template
-                subject = string_concat(subject, _("PROBLEM: "))
-            else:
-                template = recovery_template 
-                subject = string_concat(subject, _("RECOVERED: "))
-            subject += u"%s - %s" % (instance.test.project.client.name,
-                                  instance.test.project.name)
-            rendered = render_to_string(template, context)
+            subject, rendered = self.render(instance)
             self.send_emails(subject, rendered, self._get_emails())
 
+    def send_digest(self, changes, connection=None):
+        """Sends one email for all the changes, or the usual one if 
+        there's only the one.
+        """
+        if len(changes) == 1:
+            subject, rendered = self.render(changes[0])
+        else:
+            subject, rendered = self.render_digest(changes)
+        self.send_emails(subject, rendered, self._get_emails(), connection)
+
 
 class AdminEmailNotificationHandler(EmailNotificationHandler):
     """An email-based notification handler which simply
@@ -0,0 +1,50 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from lockfile import FileLock, AlreadyLocked, LockTimeout
+
+from scout.logger import log
+from scout.notifications.dispatch import dispatch_notifications, LOCK_NAME
+from scout.notifications.settings import NOTIFICATION_INTERVAL
+
+LOCK_WAIT_TIMEOUT = -1
+
+class Command(BaseCommand):
+    """
+    A management command to deliver the queued notifications.
+    """
+
+    help = ('Sends the notifications waiting in the outbox, retrying '
+            'those which failed once they are due.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--daemon', action='store_true', dest='daemon',
+                    default=False, help='Stay running, checking the outbox '
+                    'every SCOUT_NOTIFICATION_INTERVAL seconds.'),
+    )
+
+    def handle(self, *args, **options):
+        # Stops a notification being sent twice by overlapping runs.
+        lock = FileLock(LOCK_NAME)
+        try:
+            lock.acquire(LOCK_WAIT_TIMEOUT)
+        except (AlreadyLocked, LockTimeout):
+            log.warn("Lock already in place. Quitting.")
+            return
+
+        try:
+            if options.get('daemon'):
+                try:
+                    while True:
+                        dispatch_notifications()
+                        reset_queries()
+                        connection.close()
+                        time.sleep(NOTIFICATION_INTERVAL)
+                except KeyboardInterrupt:
+                    pass
+            else:
+                dispatch_notifications()
+        finally:
+            lock.release()
@@ -1,3 +1,5 @@
+import datetime
+
 from django.db import models
 
 
@@ -26,3 +28,27 @@ class NotificationProfile(models.Model):
             else:
                 self._email = self.user.email
             return self._email
+
+
+class Notification(models.Model):
+    """
+    An outbox entry; a status change waiting to be delivered by one of
+    the notification handlers. These are written when the change is 
+    logged and sent by the dispatch_notifications command, so a slow or
+    broken mail server never holds up the pinger.
+    """
+    change = models.ForeignKey('scout.StatusChange', 
+                               related_name='notifications')
+    handler = models.CharField(max_length=255)
+    date_added = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=datetime.datetime.now,
+                                        db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    date_sent = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['next_attempt']
+
+    def __unicode__(self):
+        return u"%s for change %s" % (self.handler, self.change_id)
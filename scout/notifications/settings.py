@@ -16,3 +16,26 @@ FROM_EMAIL = getattr(settings, 'SCOUT_NOTIFICATIONS_FROM_EMAIL',
 
 NOTIFICATION_HANDLERS = getattr(settings, 'SCOUT_NOTIFICATION_HANDLERS', 
                                 DEFAULT_NOTIFICATION_HANDLERS)
+
+
+# Notifications which fail to send are retried after
+# SCOUT_NOTIFICATION_RETRY_DELAY seconds, doubling each time up to
+# SCOUT_NOTIFICATION_MAX_RETRY_DELAY, until they've been tried
+# SCOUT_NOTIFICATION_MAX_ATTEMPTS times.
+NOTIFICATION_RETRY_DELAY = getattr(settings, 
+                                   'SCOUT_NOTIFICATION_RETRY_DELAY', 60)
+NOTIFICATION_MAX_RETRY_DELAY = getattr(settings, 
+                                       'SCOUT_NOTIFICATION_MAX_RETRY_DELAY',
+                                       60 * 60)
+NOTIFICATION_MAX_ATTEMPTS = getattr(settings, 
+                                    'SCOUT_NOTIFICATION_MAX_ATTEMPTS', 10)
+
+# How often, in seconds, dispatch_notifications checks the outbox
+# when it's run with --daemon.
+NOTIFICATION_INTERVAL = getattr(settings, 'SCOUT_NOTIFICATION_INTERVAL', 10)
+
+# How long, in seconds, digest handlers hold on to a status change so 
+# that those following it can be sent along in the same digest. With 
+# no window the digests take in the changes since the last dispatch.
+NOTIFICATION_DIGEST_WINDOW = getattr(settings, 
+                                     'SCOUT_NOTIFICATION_DIGEST_WINDOW', 0)
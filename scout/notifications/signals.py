@@ -1,4 +1,7 @@
-from scout.notifications.models import NotificationProfile
+import datetime
+
+from scout.notifications.models import NotificationProfile, Notification
+from scout.notifications.settings import NOTIFICATION_DIGEST_WINDOW
 
 
 def create_notification_profile(sender, instance, created, using, **kwargs):
@@ -8,3 +11,22 @@ def create_notification_profile(sender, instance, created, using, **kwargs):
     if created:
         data = {'user': instance}
         profile = NotificationProfile.objects.create(**data)
+
+
+def queue_notifications(sender, instance, created, using, **kwargs):
+    """Adds a newly logged StatusChange to the outbox 
+    of each of the queued notification handlers, held
+    back by the digest window for those sending digests.
+    """
+    from scout.notifications import handler_instances
+    if created:
+        for handler_string, handler in handler_instances.items():
+            if handler.queued:
+                next_attempt = datetime.datetime.now()
+                if handler.digest:
+                    next_attempt += datetime.timedelta(
+                                    seconds=NOTIFICATION_DIGEST_WINDOW)
+                Notification.objects.using(using).create(
+                                            change=instance, 
+                                            handler=handler_string,
+                                            next_attempt=next_attempt)
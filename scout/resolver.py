@@ -0,0 +1,114 @@
+"""A DNS cache for the pinger, so the many tests on the same few hosts
+don't each go back to the system resolver. It stands in for (and
+wraps) socket.getaddrinfo so it covers every connection the process
+makes, from any of the engine's workers.
+
+The standard library doesn't expose the TTLs of the records it looks
+up, so answers are kept for SCOUT_DNS_CACHE_TTL seconds and failed
+lookups for SCOUT_DNS_NEGATIVE_TTL.
+"""
+import socket
+import threading
+import time
+
+from scout.settings import DNS_CACHE_TTL, DNS_NEGATIVE_TTL
+
+_dns_cache = None
+_install_lock = threading.Lock()
+
+
+class DNSCache(object):
+    """Caches the results (and failures) of getaddrinfo.
+    """
+
+    def __init__(self, getaddrinfo, ttl=None, negative_ttl=None):
+        self._getaddrinfo = getaddrinfo
+        self.ttl = ttl or DNS_CACHE_TTL
+        self.negative_ttl = negative_ttl or DNS_NEGATIVE_TTL
+        # Maps the getaddrinfo arguments to (expiry time, addresses or
+        # the socket.gaierror the lookup failed with).
+        self._entries = {}
+        # The hosts which last failed to resolve, mapped to the
+        # time they can be tried again.
+        self._failures = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def getaddrinfo(self, host, port, family=0, socktype=0, proto=0,
+                    flags=0):
+        """Stands in for socket.getaddrinfo. These lookups aren't 
+        counted, as the engine looks each test's host up with resolve() 
+        just before the request makes the same lookup here.
+        """
+        return self._lookup((host, port, family, socktype, proto, flags),
+                            False)
+
+    def resolve(self, host, port, family=0, socktype=0, proto=0, flags=0):
+        """As getaddrinfo, but counted in the hits and misses.
+        """
+        return self._lookup((host, port, family, socktype, proto, flags),
+                            True)
+
+    def _lookup(self, key, count):
+        host = key[0]
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                if count:
+                    self.hits += 1
+                result = entry[1]
+            else:
+                if count:
+                    self.misses += 1
+                result = None
+        if result is None:
+            try:
+                result = self._getaddrinfo(*key)
+            except socket.gaierror, e:
+                result = e
+            ttl = self.ttl
+            if isinstance(result, socket.gaierror):
+                ttl = self.negative_ttl
+            with self._lock:
+                self._entries[key] = (now + ttl, result)
+                if isinstance(result, socket.gaierror):
+                    self._failures[host] = now + ttl
+                else:
+                    self._failures.pop(host, None)
+        if isinstance(result, socket.gaierror):
+            raise result
+        return result
+
+    def failed(self, host):
+        """Returns True if the host failed to resolve when last looked
+        up (and the failure is still cached).
+        """
+        with self._lock:
+            return self._failures.get(host, 0) > time.time()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._failures.clear()
+
+    def stats(self):
+        """Returns a two element tuple of the number of hits and misses.
+        """
+        with self._lock:
+            return self.hits, self.misses
+
+
+def get_dns_cache():
+    """Returns the process wide DNS cache, installing it in place of
+    socket.getaddrinfo the first time it's asked for.
+    """
+    global _dns_cache
+    with _install_lock:
+        if _dns_cache is None:
+            # Wraps whichever getaddrinfo is in place by now, which
+            # will be gevent's if its engine has been loaded.
+            _dns_cache = DNSCache(socket.getaddrinfo)
+            socket.getaddrinfo = _dns_cache.getaddrinfo
+    return _dns_cache
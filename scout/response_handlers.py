@@ -1,9 +1,23 @@
+import datetime
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from scout.models import ResponseTimeRollup
+from scout.settings import RESPONSE_TIME_PERIOD
+from scout.utils import chunked
+
 
 class BaseResponseHandler(object):
     """
     The base response handler class, all new response handlers
     should subclass from this one.
     """
+    # Set to True if handle_response uses the response's body; it is 
+    # only downloaded for the tests when at least one handler does.
+    # If the page hasn't changed since, the previous response's body
+    # and status are handed over again with `not_modified` set on it.
+    needs_body = False
 
     def __init__(self, test, response):
         self.test = test
@@ -24,3 +38,75 @@ class DummyResponseHandler(BaseResponseHandler):
     show an example of a ResponseHandler.
     """
     pass
+
+
+class BaseBatchResponseHandler(object):
+    """
+    The base batch response handler class. Rather than being created 
+    for every response, batch response handlers are created once by 
+    the PingRunner and then handed the results of the tests in bulk;
+    at the end of each run or every SCOUT_BATCH_SIZE results.
+    """
+    # As for BaseResponseHandler.
+    needs_body = False
+
+    def handle_results(self, results):
+        """
+        Called with a list of CheckResult (test, response, elapsed) 
+        tuples, where response is a CheckFailure if the test didn't 
+        get one. It does not need to return anything.
+        """
+        pass
+
+
+class ResponseTimeRollupHandler(BaseBatchResponseHandler):
+    """
+    Records the response time of every test which got a response into
+    the ResponseTimeRollup for the current period, with one query per
+    rollup rather than per check.
+    """
+
+    def handle_results(self, results):
+        period_start = ResponseTimeRollup.get_period_start(
+                        datetime.datetime.now(), RESPONSE_TIME_PERIOD)
+        times = defaultdict(list)
+        for result in results:
+            if not hasattr(result.response, 'status_code'):
+                continue
+            # For streamed requests, which all the PingRunner's are,
+            # requests times up to the headers being parsed.
+            ttfb = result.response.elapsed.total_seconds() * 1000
+            times[result.test.pk].append((result.elapsed * 1000, ttfb))
+        for pks in chunked(times.keys(), 500):
+            rollups = dict((rollup.test_id, rollup) for rollup in 
+                        ResponseTimeRollup.objects.filter(test__in=pks,
+                                    period_length=RESPONSE_TIME_PERIOD,
+                                    period_start=period_start))
+            for pk in pks:
+                rollup = rollups.get(pk) or ResponseTimeRollup(test_id=pk,
+                                    period_length=RESPONSE_TIME_PERIOD,
+                                    period_start=period_start)
+                for elapsed, ttfb in times[pk]:
+                    rollup.add(elapsed, ttfb)
+                # Saves Django checking whether the row exists first.
+                if pk in rollups:
+                    rollup.save(force_update=True)
+                else:
+                    self._insert(rollup)
+
+    def _insert(self, rollup):
+        """Saves the new rollup, or adds it to the existing one if
+        another pinger has saved one for the period since it was read.
+        """
+        sid = transaction.savepoint()
+        try:
+            rollup.save(force_insert=True)
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            existing = ResponseTimeRollup.objects.get(test=rollup.test_id,
+                                period_length=rollup.period_length,
+                                period_start=rollup.period_start)
+            existing.add_rollup(rollup)
+            existing.save(force_update=True)
+        else:
+            transaction.savepoint_commit(sid)
@@ -0,0 +1,56 @@
+import datetime
+import time
+
+from django.db import transaction
+from django.db.models import Max
+
+from scout.logger import log
+from scout.models import StatusTest, StatusChange
+from scout.settings import RETENTION_DAYS, RETENTION_CHUNK_SIZE
+
+
+def prune_status_changes(days=None, chunk_size=None, pause=0):
+    """Deletes the StatusChanges older than `days` (SCOUT_RETENTION_DAYS
+    by default), other than the latest of each test so that the current
+    state is never lost. The rolled up response times are kept forever.
+
+    The rows are deleted `chunk_size` at a time, each chunk in its own 
+    transaction and with an optional `pause` between them, so the table 
+    is never locked for long. Returns a two element tuple of the number
+    of rows removed and the number of seconds it took.
+    """
+    days = days or RETENTION_DAYS
+    chunk_size = chunk_size or RETENTION_CHUNK_SIZE
+    start = time.time()
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    # The latest change of each test, whether or not the test's
+    # last_change has been filled in yet; found the once as there's
+    # only one per test, rather than with every chunk.
+    kept = set(StatusChange.objects.values('test')\
+                    .annotate(latest=Max('pk'))\
+                    .values_list('latest', flat=True))
+    kept.update(StatusTest.objects.filter(last_change__isnull=False)\
+                    .values_list('last_change', flat=True))
+    prunable = StatusChange.objects.filter(date_added__lt=cutoff)\
+                    .order_by('pk')
+    removed = 0
+    last_pk = 0
+    while True:
+        chunk = list(prunable.filter(pk__gt=last_pk)\
+                        .values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1]
+        pks = [pk for pk in chunk if pk not in kept]
+        if pks:
+            with transaction.commit_on_success():
+                StatusChange.objects.filter(pk__in=pks).delete()
+            removed += len(pks)
+        if len(chunk) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    elapsed = time.time() - start
+    log.info("Removed %s status changes older than %s days in %.2fs." % (
+                removed, days, elapsed))
+    return removed, elapsed
@@ -0,0 +1,162 @@
+import datetime
+import heapq
+import time
+
+from django.db import connection, reset_queries
+
+from scout.logger import log
+from scout.models import StatusChange
+from scout.settings import (CHECK_INTERVAL, REFRESH_INTERVAL, 
+                            ADAPTIVE_SCHEDULING, MIN_CHECK_INTERVAL,
+                            MAX_CHECK_INTERVAL, STABLE_PERIOD)
+
+
+def get_check_interval(test, now=None):
+    """Returns the number of seconds to wait before running the test 
+    again; its check interval, adapted to how settled the test is with
+    SCOUT_ADAPTIVE_SCHEDULING (see scout.settings). An interval set on
+    the test is shortened while it's failing but never lengthened.
+    """
+    interval = test.check_interval or CHECK_INTERVAL
+    if not ADAPTIVE_SCHEDULING:
+        return interval
+    if test.last_result == StatusChange.UNEXPECTED:
+        return min(interval, MIN_CHECK_INTERVAL)
+    if test.last_change is None:
+        return interval
+    stable_for = (now or datetime.datetime.now()) - \
+                        test.last_change.date_added
+    periods = int((stable_for.days * 86400 + stable_for.seconds) / 
+                  STABLE_PERIOD)
+    if periods == 0:
+        # It's just changed, or it keeps changing.
+        return min(interval, MIN_CHECK_INTERVAL)
+    if test.check_interval:
+        # Set for the test, so it's never backed off.
+        return interval
+    # Stop counting once it's well past the maximum.
+    backoff = interval * 2 ** min(periods - 1, 32)
+    return max(interval, min(backoff, MAX_CHECK_INTERVAL))
+
+
+class Scheduler(object):
+    """Keeps a PingRunner resident, running each test whenever it falls
+    due rather than running every test on every invocation. The tests
+    are held in a priority queue of next-due times and the set of tests 
+    is reloaded every `refresh_interval` seconds so that added, changed 
+    and removed tests are picked up without a restart.
+    """
+
+    def __init__(self, runner, refresh_interval=None):
+        self.runner = runner
+        self.refresh_interval = refresh_interval or REFRESH_INTERVAL
+        # A heap of (next due time, test pk) tuples.
+        self._queue = []
+        # The tests currently scheduled, keyed by pk; queue entries for
+        # pks no longer in here are discarded as they come up.
+        self._tests = {}
+        # Maps the pks of the scheduled tests to the time they're due, 
+        # queue entries for any other time are stale (the test was
+        # removed and added again) and are discarded too.
+        self._due = {}
+        self._next_refresh = 0
+        # A list of [next run time, interval, callable] for the 
+        # housekeeping tasks run alongside the tests.
+        self._tasks = []
+        self._running = False
+
+    def add_task(self, interval, func):
+        """Has the scheduler call `func` every `interval` seconds, 
+        starting straight away.
+        """
+        self._tasks.append([0, interval, func])
+
+    def get_interval(self, test):
+        """Returns the number of seconds to wait between runs of the test.
+        """
+        return get_check_interval(test)
+
+    def refresh(self):
+        """Reloads the tests from the runner, scheduling any new ones
+        to run when they're next due, or straight away.
+        """
+        tests = dict((test.pk, test) for test in self.runner.get_tests())
+        now = time.time()
+        for pk, test in tests.items():
+            if pk not in self._tests:
+                due = now
+                if test.next_check is not None:
+                    due = time.mktime(test.next_check.timetuple())
+                self.schedule(pk, due)
+        for pk in set(self._tests) - set(tests):
+            self._due.pop(pk, None)
+        log.info("Scheduling %s tests (%s added, %s removed)." % (
+                    len(tests), 
+                    len(set(tests) - set(self._tests)),
+                    len(set(self._tests) - set(tests))))
+        self._tests = tests
+        self._next_refresh = now + self.refresh_interval
+
+    def schedule(self, pk, due):
+        """Queues the test with the pk to run at `due`.
+        """
+        self._due[pk] = due
+        heapq.heappush(self._queue, (due, pk))
+
+    def get_due_tests(self):
+        """Pops and returns all of the tests which are now due.
+        """
+        now = time.time()
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            due_at, pk = heapq.heappop(self._queue)
+            if pk in self._tests and self._due.get(pk) == due_at:
+                del self._due[pk]
+                due.append(self._tests[pk])
+        return due
+
+    def tick(self):
+        """Runs whichever tests are due, then schedules their next runs.
+        """
+        if time.time() >= self._next_refresh:
+            self.refresh()
+        due = self.get_due_tests()
+        if due:
+            self.runner.run_tests(due)
+            now = time.time()
+            for test in due:
+                self.schedule(test.pk, now + self.get_interval(test))
+        for task in self._tasks:
+            if time.time() >= task[0]:
+                try:
+                    task[2]()
+                except Exception:
+                    # A failing task mustn't take the tests down with it.
+                    log.exception("Scheduled task failed.")
+                task[0] = time.time() + task[1]
+        # Don't hold on to a connection (and with it, on some backends, a
+        # stale snapshot) while sleeping, nor build up the DEBUG query log.
+        reset_queries()
+        connection.close()
+
+    def get_sleep_time(self):
+        """Returns the number of seconds until there is something to do.
+        """
+        wake_at = self._next_refresh
+        if self._queue:
+            wake_at = min(wake_at, self._queue[0][0])
+        for task in self._tasks:
+            wake_at = min(wake_at, task[0])
+        return max(0, wake_at - time.time())
+
+    def run(self):
+        """Runs the tests forever, or until stop() is called.
+        """
+        self._running = True
+        while self._running:
+            self.tick()
+            if self._running:
+                time.sleep(self.get_sleep_time())
+
+    def stop(self):
+        self._running = False
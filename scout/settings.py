@@ -11,9 +11,133 @@ LOGGING_LEVEL = getattr(settings, 'IPADCATALOGUE_LOGGING_LEVEL', logging.INFO)
 LOGGING_FORMAT = getattr(settings, 'IPADCATALOGUE_LOGGING_FORMAT', 
     "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
+# The PingRunner class used by run_pinger, this can be swapped for
+# scout.gevent_engine.GeventPingRunner to run the tests from an
+# event loop rather than from threads.
+ENGINE = getattr(settings, 'SCOUT_ENGINE', 'scout.engine.PingRunner')
+
 DEFAULT_RESPONSE_HANDLERS = (
     'scout.response_handlers.DummyResponseHandler',
 )
 
 RESPONSE_HANDLERS = getattr(settings, 'SCOUT_RESPONSE_HANDLERS', 
                             DEFAULT_RESPONSE_HANDLERS)
+
+DEFAULT_BATCH_RESPONSE_HANDLERS = (
+    'scout.response_handlers.ResponseTimeRollupHandler',
+)
+
+BATCH_RESPONSE_HANDLERS = getattr(settings, 'SCOUT_BATCH_RESPONSE_HANDLERS', 
+                                  DEFAULT_BATCH_RESPONSE_HANDLERS)
+
+# The length, in seconds, of the periods response times are rolled up
+# over; shorter periods give finer graphs at the cost of more rows.
+RESPONSE_TIME_PERIOD = getattr(settings, 'SCOUT_RESPONSE_TIME_PERIOD', 3600)
+
+# The number of results batch response handlers are handed at a time,
+# None to hand them all of a run's results at once.
+BATCH_SIZE = getattr(settings, 'SCOUT_BATCH_SIZE', None)
+
+# The number of tests which may be run concurrently; the requests
+# are made from a pool of threads of this size.
+MAX_WORKERS = getattr(settings, 'SCOUT_MAX_WORKERS', 1)
+
+# The default number of seconds to wait for a connection to be made, and
+# then for the response to be read, these can be overridden per test.
+CONNECT_TIMEOUT = getattr(settings, 'SCOUT_CONNECT_TIMEOUT', 10)
+READ_TIMEOUT = getattr(settings, 'SCOUT_READ_TIMEOUT', 30)
+
+# The number of seconds a run of the pinger may take before its unfinished
+# tests are abandoned and logged as timeouts; None to never abandon them.
+RUN_DEADLINE = getattr(settings, 'SCOUT_RUN_DEADLINE', None)
+
+# When run as a daemon, the default number of seconds between runs of a
+# test (this can be set per test) and how often the set of tests is
+# reloaded to pick up any added or removed.
+CHECK_INTERVAL = getattr(settings, 'SCOUT_CHECK_INTERVAL', 60)
+REFRESH_INTERVAL = getattr(settings, 'SCOUT_REFRESH_INTERVAL', 60)
+
+# Whether to adapt the interval between runs of each test to its history;
+# failing tests, and those which changed within the last STABLE_PERIOD 
+# seconds, are run every MIN_CHECK_INTERVAL seconds while the interval of
+# stable ones doubles with each further STABLE_PERIOD they stay that way,
+# up to MAX_CHECK_INTERVAL. Tests with their own check_interval are still
+# run more often while failing or changing but are never backed off.
+# Applies to both cron and daemon runs; with it off every cron run checks
+# every test, as before.
+ADAPTIVE_SCHEDULING = getattr(settings, 'SCOUT_ADAPTIVE_SCHEDULING', False)
+MIN_CHECK_INTERVAL = getattr(settings, 'SCOUT_MIN_CHECK_INTERVAL', 30)
+MAX_CHECK_INTERVAL = getattr(settings, 'SCOUT_MAX_CHECK_INTERVAL', 600)
+STABLE_PERIOD = getattr(settings, 'SCOUT_STABLE_PERIOD', 60 * 60)
+
+# Whether run_pinger splits the tests with the other pinger nodes; each
+# node is identified by SCOUT_NODE_NAME (or its hostname) and is deemed
+# dead once it hasn't been seen for SHARD_LEASE_TIMEOUT seconds, at which
+# point its tests are taken over by the others. The timeout must be longer
+# than the time between runs (or SCOUT_REFRESH_INTERVAL for daemons).
+SHARDING = getattr(settings, 'SCOUT_SHARDING', False)
+NODE_NAME = getattr(settings, 'SCOUT_NODE_NAME', None)
+SHARD_LEASE_TIMEOUT = getattr(settings, 'SCOUT_SHARD_LEASE_TIMEOUT', 300)
+
+# The number of days of status changes kept by prune_status_changes (and
+# by the daemon, every RETENTION_INTERVAL seconds), None to keep them all.
+# They are deleted RETENTION_CHUNK_SIZE at a time.
+RETENTION_DAYS = getattr(settings, 'SCOUT_RETENTION_DAYS', None)
+RETENTION_INTERVAL = getattr(settings, 'SCOUT_RETENTION_INTERVAL', 86400)
+RETENTION_CHUNK_SIZE = getattr(settings, 'SCOUT_RETENTION_CHUNK_SIZE', 1000)
+
+# The longest gap, in seconds, between two runs of a test which is counted
+# towards its uptime; anything longer means the pinger wasn't running. Tests
+# checked less often are allowed twice their check interval.
+UPTIME_MAX_GAP = getattr(settings, 'SCOUT_UPTIME_MAX_GAP', 3600)
+
+# The HTTP session keeps a pool of connections for up to POOL_CONNECTIONS
+# hosts, holding on to at most POOL_MAXSIZE idle connections per host.
+POOL_CONNECTIONS = getattr(settings, 'SCOUT_POOL_CONNECTIONS', 100)
+POOL_MAXSIZE = getattr(settings, 'SCOUT_POOL_MAXSIZE', 10)
+
+# Bodies the response handlers don't need are still read, up to this many
+# bytes, so the connection can be reused; larger ones are left unread and
+# the connection closed.
+DRAIN_BODY_BYTES = getattr(settings, 'SCOUT_DRAIN_BODY_BYTES', 4096)
+
+# How long, in seconds, the pinger caches the addresses it looks up, and
+# the lookups which fail; set DNS_CACHE_TTL to 0 to use the system
+# resolver every time (DNS failures are then reported as connection ones).
+DNS_CACHE_TTL = getattr(settings, 'SCOUT_DNS_CACHE_TTL', 60)
+DNS_NEGATIVE_TTL = getattr(settings, 'SCOUT_DNS_NEGATIVE_TTL', 10)
+
+# Whether the pinger times each phase of its checks and keeps count of
+# them, in the cache, for the metrics view (see scout.metrics). This needs
+# a cache shared between processes, such as memcached; they aren't recorded
+# with the local memory or dummy caches.
+METRICS = getattr(settings, 'SCOUT_METRICS', True)
+
+# The number of requests the gevent engine keeps in flight at once.
+GEVENT_POOL_SIZE = getattr(settings, 'SCOUT_GEVENT_POOL_SIZE', 1000)
+
+# The number of seconds a rendered wall is cached for; it's cached against
+# the state version and the minute (for its relative times) so is replaced
+# as soon as either changes anyway.
+WALL_CACHE_TIMEOUT = getattr(settings, 'SCOUT_WALL_CACHE_TIMEOUT', 60)
+
+# The most status changes the JSON API returns from a single request.
+API_CHANGES_LIMIT = getattr(settings, 'SCOUT_API_CHANGES_LIMIT', 500)
+
+# The longest the JSON API holds on to a request made with `wait`, waiting
+# for a status change, and how often it checks the database for changes
+# logged by other processes.
+LONG_POLL_TIMEOUT = getattr(settings, 'SCOUT_LONG_POLL_TIMEOUT', 25)
+LONG_POLL_INTERVAL = getattr(settings, 'SCOUT_LONG_POLL_INTERVAL', 1)
+
+# Whether tests whose bodies are read for the response handlers send
+# conditional requests, with the ETag and Last-Modified of the previous
+# response, handing the handlers that response again on a 304; how long, 
+# in seconds, the previous responses are kept in the cache and the largest
+# body kept (memcached refuses items of over 1MB by default). This needs a
+# cache shared between processes, such as memcached (see scout.validators).
+CONDITIONAL_REQUESTS = getattr(settings, 'SCOUT_CONDITIONAL_REQUESTS', True)
+VALIDATOR_CACHE_TIMEOUT = getattr(settings, 'SCOUT_VALIDATOR_CACHE_TIMEOUT',
+                                  60 * 60 * 24)
+VALIDATOR_MAX_BODY_BYTES = getattr(settings, 
+                                   'SCOUT_VALIDATOR_MAX_BODY_BYTES', 1000000)
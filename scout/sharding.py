@@ -0,0 +1,68 @@
+import datetime
+import hashlib
+import socket
+
+from scout.logger import log
+from scout.models import PingerNode
+from scout.settings import NODE_NAME, SHARD_LEASE_TIMEOUT
+
+
+class ShardCoordinator(object):
+    """Splits the tests between every pinger node with a live lease in
+    the database so several nodes can share the work without any of
+    them testing the same URL.
+
+    Projects (rather than tests) are assigned to nodes by rendezvous 
+    hashing, keeping each project's tests together so its status can 
+    be worked out by a single node, and meaning that when a node joins 
+    or its lease expires only the projects it gains or loses move.
+    """
+
+    def __init__(self, node_name=None, lease_timeout=None):
+        self.node_name = node_name or NODE_NAME or socket.gethostname()
+        self.lease_timeout = lease_timeout or SHARD_LEASE_TIMEOUT
+
+    def heartbeat(self):
+        """Takes out, or renews, this node's lease.
+        """
+        now = datetime.datetime.now()
+        updated = PingerNode.objects.filter(name=self.node_name)\
+                                    .update(last_seen=now)
+        if not updated:
+            PingerNode.objects.create(name=self.node_name, last_seen=now)
+
+    def leave(self):
+        """Gives up this node's lease so the other nodes take over
+        its tests straight away rather than once it has expired.
+        """
+        PingerNode.objects.filter(name=self.node_name).delete()
+
+    def get_live_nodes(self):
+        """Returns the sorted names of the nodes with unexpired leases.
+        """
+        expiry = datetime.datetime.now() - \
+                    datetime.timedelta(seconds=self.lease_timeout)
+        nodes = set(PingerNode.objects.filter(last_seen__gte=expiry)\
+                                      .values_list('name', flat=True))
+        nodes.add(self.node_name)
+        return sorted(nodes)
+
+    def get_owner(self, project_pk, nodes):
+        """Returns the name of the node, out of those given, which
+        the project's tests belong to.
+        """
+        return max(nodes, key=lambda node: hashlib.md5(
+                        '%s:%s' % (node, project_pk)).hexdigest())
+
+    def filter_tests(self, tests):
+        """Renews this node's lease then returns the tests, out of 
+        those given, which belong to it.
+        """
+        self.heartbeat()
+        nodes = self.get_live_nodes()
+        owned = [test for test in tests 
+                 if self.get_owner(test.project_id, nodes) == self.node_name]
+        log.info("Node %s of %s (%s) has %s of %s tests." % (
+                    nodes.index(self.node_name) + 1, len(nodes),
+                    self.node_name, len(owned), len(tests)))
+        return owned
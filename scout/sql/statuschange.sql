@@ -0,0 +1,3 @@
+-- Covers the per-test history lookups, latest first; Django can't
+-- declare composite indexes so it's installed by syncdb from here.
+CREATE INDEX scout_statuschange_test_id_date_added ON scout_statuschange (test_id, date_added);
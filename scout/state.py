@@ -0,0 +1,64 @@
+"""The version of the monitoring state, which anything rendered from it
+(the wall, the status API) is cached against and served with as its 
+ETag, and which anything waiting on the state to change can watch.
+
+The version is read from the database, so that every process agrees on
+it whatever the cache backend. It's made up of the latest StatusChange
+and the minute the projects were last checked, the only things on the
+wall which change as the pinger runs, so clients polling between changes 
+get the same version back (and a 304) for the cost of two queries. The
+wall adds the current minute to it, for its relative times.
+"""
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import Max
+
+from scout.models import Project, StatusChange
+from scout.settings import LONG_POLL_INTERVAL
+
+# Notified whenever the state is changed from within this process.
+_changed = threading.Condition()
+
+
+def get_version():
+    """Returns the current version of the monitoring state.
+    """
+    cursor = StatusChange.objects.aggregate(latest=Max('pk'))['latest']
+    checked = Project.objects.aggregate(latest=Max('date_updated'))['latest']
+    return '%s-%s' % (cursor or 0, 
+                      checked.strftime('%Y%m%d%H%M') if checked else 0)
+
+
+def notify_change():
+    """Wakes anything in this process waiting on the state to change,
+    to be called after writing a change to it.
+    """
+    with _changed:
+        _changed.notify_all()
+
+
+@transaction.autocommit
+def wait_for_change(cursor, timeout):
+    """Blocks until a StatusChange is logged after the one with the pk
+    `cursor`, or until `timeout` seconds have passed; returns True if
+    there is one.
+    
+    Changes logged from this process wake the waiters immediately, those 
+    logged by other processes (normally the pinger) are picked up by 
+    checking for them every SCOUT_LONG_POLL_INTERVAL seconds. The 
+    transaction is ended before each check, as on some backends (MySQL's
+    REPEATABLE READ) it would otherwise never see the pinger's commits.
+    """
+    deadline = time.time() + timeout
+    changes = StatusChange.objects.filter(pk__gt=cursor)
+    while True:
+        transaction.commit_unless_managed()
+        if changes.exists():
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        with _changed:
+            _changed.wait(min(LONG_POLL_INTERVAL, remaining))
@@ -12,6 +12,42 @@ $.scout.visibility = {
     }
 };
 
+$.scout.live = {
+    // Long-polls the status API, reloading the wall as 
+    // soon as a status change is logged.
+    init: function() {
+        this.$list = $('[data-status-url]');
+        if (!this.$list.length) {
+            return;
+        }
+        this.url = this.$list.attr('data-status-url');
+        this.cursor = this.$list.attr('data-cursor');
+        this.poll();
+    },
+    poll: function() {
+        $.ajax({
+            url: this.url,
+            data: {since: this.cursor, wait: 1},
+            dataType: 'json',
+            cache: false,
+            success: $.proxy(this, 'update'),
+            error: $.proxy(this, 'retry')
+        });
+    },
+    update: function(data) {
+        if (data.changes.length) {
+            window.location.reload();
+            return;
+        }
+        this.cursor = data.cursor;
+        this.poll();
+    },
+    retry: function() {
+        setTimeout($.proxy(this, 'poll'), 5000);
+    }
+};
+
 $(document).ready(function() {
     $.scout.visibility.init();
+    $.scout.live.init();
 });
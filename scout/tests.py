@@ -0,0 +1,301 @@
+import BaseHTTPServer
+import datetime
+import threading
+import time
+
+import requests
+from django.db import connection
+from django.test import TestCase
+
+from scout.benchmark import StubServer
+from scout.engine import PingRunner
+from scout.models import (Client, Project, StatusTest, StatusChange,
+                          ResponseTimeRollup)
+from scout.response_handlers import (BaseResponseHandler, 
+                                     ResponseTimeRollupHandler)
+from scout.retention import prune_status_changes
+from scout.scheduler import Scheduler
+
+
+class FakeResponse(object):
+    """Stands in for a streamed requests response with an empty body.
+    """
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {'Content-Length': '0'}
+        self.elapsed = datetime.timedelta(milliseconds=10)
+        self.content = ''
+        self.raw = None
+
+    def close(self):
+        pass
+
+
+class FakeSession(requests.Session):
+    """Answers every request with a 200, without touching the network.
+    """
+
+    def request(self, method, url, **kwargs):
+        return FakeResponse(200)
+
+
+class CountingPingRunner(PingRunner):
+    """Records the number of queries made by the last run before the
+    checks started and while they were being made.
+    """
+
+    def run_tests(self, tests=None):
+        self._queries = [len(connection.queries)]
+        return super(CountingPingRunner, self).run_tests(tests)
+
+    def _check_all(self, tests):
+        self._queries.append(len(connection.queries))
+        super(CountingPingRunner, self)._check_all(tests)
+        self._queries.append(len(connection.queries))
+
+    @property
+    def setup_queries(self):
+        return self._queries[1] - self._queries[0]
+
+    @property
+    def check_queries(self):
+        return self._queries[2] - self._queries[1]
+
+
+def create_tests(count):
+    client = Client.objects.create(name='Client %s' % count)
+    project = Project.objects.create(client=client,
+                                     name='Project %s' % count)
+    for i in range(count):
+        StatusTest.objects.create(project=project, expected_status=200,
+                                  url='http://example.com/%s/%s' % (count, i))
+
+
+class PingRunnerQueryTest(TestCase):
+
+    def setUp(self):
+        # Keeps the query log with DEBUG off, as assertNumQueries does.
+        self._use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+
+    def tearDown(self):
+        connection.use_debug_cursor = self._use_debug_cursor
+
+    def run_pinger(self, count):
+        """Runs the tests twice and returns the runner, the second run
+        logging nothing as the responses haven't changed.
+        """
+        StatusTest.objects.update(is_active=False)
+        create_tests(count)
+        runner = CountingPingRunner(workers=1,
+                response_handlers=[
+                    'scout.response_handlers.DummyResponseHandler'],
+                batch_response_handlers=[
+                    'scout.response_handlers.BaseBatchResponseHandler'])
+        runner.session = FakeSession()
+        runner.dns_cache = None
+        runner.run_tests()
+        runner.run_tests()
+        return runner
+
+    def test_latest_changes_are_preloaded(self):
+        runner = self.run_pinger(5)
+        self.assertEqual(StatusChange.objects.count(), 5)
+        self.assertEqual(runner.check_queries, 0)
+        setup_queries = runner.setup_queries
+        runner = self.run_pinger(10)
+        self.assertEqual(StatusChange.objects.count(), 15)
+        self.assertEqual(runner.check_queries, 0)
+        self.assertEqual(runner.setup_queries, setup_queries)
+
+
+class WallQueryTest(TestCase):
+
+    urls = 'scout.urls'
+
+    def setUp(self):
+        self._use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+
+    def tearDown(self):
+        connection.use_debug_cursor = self._use_debug_cursor
+
+    def create_projects(self, count):
+        start = Project.objects.count()
+        for i in range(start, start + count):
+            client = Client.objects.create(name='Client %s' % i)
+            project = Project.objects.create(client=client,
+                                             name='Project %s' % i)
+            for j in range(2):
+                test = StatusTest.objects.create(project=project,
+                            expected_status=200,
+                            url='http://example.com/%s/%s' % (i, j))
+                change = StatusChange.objects.create(test=test,
+                            expected_status=200, returned_status=200,
+                            result=StatusChange.EXPECTED)
+                StatusTest.objects.filter(pk=test.pk).update(
+                            last_change=change, last_result=change.result)
+
+    def count_queries(self):
+        # The query log is reset as the request starts.
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        return len(connection.queries)
+
+    def test_query_count_is_constant(self):
+        self.create_projects(3)
+        queries = self.count_queries()
+        self.assertEqual(queries, 5)
+        self.create_projects(6)
+        self.assertEqual(self.count_queries(), queries)
+
+
+class StallingRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Sends the headers and the start of a large body, then stalls.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '10000')
+        self.end_headers()
+        self.wfile.write('x' * 10)
+        self.wfile.flush()
+        time.sleep(3)
+
+    def log_message(self, *args):
+        pass
+
+
+class BodyResponseHandler(BaseResponseHandler):
+    needs_body = True
+
+
+class SlowBodyTest(TestCase):
+
+    def setUp(self):
+        self.server = StubServer(('127.0.0.1', 0), StallingRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def test_stalled_body_is_a_timeout(self):
+        create_tests(0)
+        project = Project.objects.get()
+        test = StatusTest.objects.create(project=project, 
+                    expected_status=200, max_body_bytes=5000, 
+                    read_timeout=1,
+                    url='http://%s:%s/' % self.server.server_address)
+        runner = PingRunner(workers=1, response_handlers=[
+                                'scout.tests.BodyResponseHandler'])
+        runner.run_tests()
+        test = StatusTest.objects.get(pk=test.pk)
+        self.assertEqual(test.last_change.failure, 
+                         StatusChange.FAILURE_TIMEOUT)
+        self.assertNotEqual(test.last_checked, None)
+
+
+class FakeTest(object):
+
+    def __init__(self, pk):
+        self.pk = pk
+        self.next_check = None
+
+
+class FakeRunner(object):
+    """Hands the scheduler whichever tests are in `tests`, and keeps
+    a list of those it runs.
+    """
+
+    def __init__(self, tests):
+        self.tests = tests
+        self.runs = []
+
+    def get_tests(self):
+        return self.tests
+
+    def run_tests(self, tests):
+        self.runs.extend(test.pk for test in tests)
+
+
+class SchedulerTest(TestCase):
+
+    def test_readded_test_is_scheduled_once(self):
+        test = FakeTest(1)
+        runner = FakeRunner([test])
+        scheduler = Scheduler(runner)
+        scheduler.refresh()
+        runner.tests = []
+        scheduler.refresh()
+        runner.tests = [test]
+        scheduler.refresh()
+        self.assertEqual(scheduler.get_due_tests(), [test])
+        self.assertEqual(scheduler.get_due_tests(), [])
+
+
+class RetentionTest(TestCase):
+
+    def test_latest_change_of_each_test_is_kept(self):
+        create_tests(2)
+        first, second = StatusTest.objects.order_by('pk')
+        old = datetime.datetime.now() - datetime.timedelta(days=40)
+        for test in (first, second):
+            for i in range(3):
+                change = StatusChange.objects.create(test=test, 
+                            expected_status=200, returned_status=200,
+                            result=StatusChange.EXPECTED)
+        StatusChange.objects.update(date_added=old)
+        # Only the first test has its last_change filled in.
+        first_latest = first.status_changes.latest('pk')
+        StatusTest.objects.filter(pk=first.pk).update(
+                            last_change=first_latest)
+        removed, elapsed = prune_status_changes(days=30, chunk_size=2)
+        self.assertEqual(removed, 4)
+        self.assertEqual(list(StatusChange.objects.order_by('pk')), 
+                         [first_latest, change])
+
+
+class ResponseTimeRollupTest(TestCase):
+
+    def make_rollup(self, times):
+        rollup = ResponseTimeRollup()
+        for elapsed in times:
+            rollup.add(elapsed, elapsed / 2.0)
+        return rollup
+
+    def test_percentile(self):
+        rollup = self.make_rollup([5, 20, 20, 90, 120])
+        self.assertEqual(rollup.percentile(20), 10)
+        self.assertEqual(rollup.percentile(50), 25)
+        self.assertEqual(rollup.percentile(100), 120)
+        self.assertEqual(self.make_rollup([40000]).percentile(50), 40000)
+        self.assertEqual(ResponseTimeRollup().percentile(50), None)
+
+    def test_merge(self):
+        merged = ResponseTimeRollup.merge([self.make_rollup([5, 20]),
+                                           ResponseTimeRollup(),
+                                           self.make_rollup([120])])
+        self.assertEqual(merged.count, 3)
+        self.assertEqual(merged.total, 145)
+        self.assertEqual((merged.minimum, merged.maximum), (5, 120))
+        self.assertEqual(merged.ttfb_count, 3)
+        self.assertEqual(merged.ttfb_total, 72.5)
+        self.assertEqual(merged.get_counts(), 
+                         self.make_rollup([5, 20, 120]).get_counts())
+
+    def test_insert_adds_to_rollup_saved_since(self):
+        create_tests(1)
+        test = StatusTest.objects.get()
+        period_start = datetime.datetime(2012, 1, 1)
+        for times in ([5, 20], [120]):
+            rollup = self.make_rollup(times)
+            rollup.test = test
+            rollup.period_start = period_start
+            rollup.period_length = 3600
+            ResponseTimeRollupHandler()._insert(rollup)
+        rollup = ResponseTimeRollup.objects.get()
+        self.assertEqual((rollup.count, rollup.total), (3, 145))
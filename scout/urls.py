@@ -1,7 +1,9 @@
 from django.conf.urls.defaults import patterns, url
 
-from scout.views import WallView
+from scout.views import WallView, StatusView, MetricsView
 
 urlpatterns = patterns('scout.views',
     url(r'^$', WallView.as_view(), name="scout_index"),
+    url(r'^api/status/$', StatusView.as_view(), name="scout_status_api"),
+    url(r'^metrics/$', MetricsView.as_view(), name="scout_metrics"),
 )
@@ -13,3 +13,18 @@ def get_module_from_module_string(string):
         raise ImproperlyConfigured("Failed to import %s: %s." % (string, e))
     else:
         return klass
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of up to `size` items from the iterable, used to
+    keep IN clauses within the limits of the database backends.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,85 @@
+"""The validators (ETag and Last-Modified) of the last full response to
+each test are kept on its StatusTest, and the response's status and body
+in the cache, so that the next request for it can be made conditional;
+on a 304 the body it would have downloaded is taken from the cache 
+instead.
+
+The bodies are only cached with a cache shared between processes, as 
+cron starts a new pinger for every run, and only up to 
+SCOUT_VALIDATOR_MAX_BODY_BYTES, as memcached refuses items of over a 
+megabyte by default. Requests are only made conditional when there's a
+body to hand the handlers should the page not have changed.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from scout.settings import VALIDATOR_CACHE_TIMEOUT, VALIDATOR_MAX_BODY_BYTES
+
+# The longest validator kept, the size of the StatusTest fields.
+MAX_VALIDATOR_LENGTH = 255
+
+
+def get_cache_key(test, etag, last_modified):
+    # The URL and validators are part of the key so a response is only
+    # ever handed back for the same page, and version of it.
+    key = u'%s\n%s\n%s' % (test.url, etag, last_modified)
+    return 'scout:validators:%s:%s' % (test.pk, 
+                                       hashlib.md5(key.encode('utf-8'))\
+                                            .hexdigest())
+
+
+def get_cached_response(test):
+    """Returns the cached response to the test, a dict of `etag`,
+    `last_modified`, `status_code` and `content`, or None.
+    """
+    if not test.etag and not test.last_modified:
+        return None
+    cached = cache.get(get_cache_key(test, test.etag, test.last_modified))
+    if cached is not None:
+        cached.update({'etag': test.etag, 
+                       'last_modified': test.last_modified})
+    return cached
+
+
+def get_conditional_headers(cached):
+    """Returns the headers making a request conditional on the cached
+    response having changed.
+    """
+    headers = {}
+    if cached is not None:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+    return headers
+
+
+def cache_response(test, response):
+    """Records the response's validators on the test, flagging it with
+    `validators_changed` if they have, and caches the response if it
+    has any to make the next request for it conditional on.
+    """
+    etag = response.headers.get('ETag') or ''
+    last_modified = response.headers.get('Last-Modified') or ''
+    if len(etag) > MAX_VALIDATOR_LENGTH or \
+            len(last_modified) > MAX_VALIDATOR_LENGTH:
+        etag = last_modified = ''
+    if (etag, last_modified) != (test.etag, test.last_modified):
+        test.etag, test.last_modified = etag, last_modified
+        test.validators_changed = True
+    if (etag or last_modified) and \
+            len(response.content) <= VALIDATOR_MAX_BODY_BYTES:
+        cache.set(get_cache_key(test, etag, last_modified), {
+            'status_code': response.status_code,
+            'content': response.content,
+        }, VALIDATOR_CACHE_TIMEOUT)
+
+
+def use_cached_response(response, cached):
+    """Stands the cached status code and body in for those of the 304
+    response, flagging it as `not_modified`.
+    """
+    response.status_code = cached['status_code']
+    response._content = cached['content']
+    response.not_modified = True
@@ -1,6 +1,79 @@
-from django.views.generic import ListView
+import datetime
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils import simplejson
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.generic import ListView, View
+
+from scout.metrics import render_metrics, is_cache_shared
+from scout.models import Project, StatusTest, StatusChange
+from scout.settings import (WALL_CACHE_TIMEOUT, API_CHANGES_LIMIT, 
+                            LONG_POLL_TIMEOUT)
+from scout.state import get_version, wait_for_change
+
+
+def get_projects():
+    """Returns the active projects, along with their clients, tests and 
+    the tests' latest changes, in a constant number of queries; the 
+    tests are attached to each project as `test_list`.
+    """
+    projects = list(Project.active.select_related('client')\
+                        .order_by('working', 'client__name', 'name'))
+    tests = StatusTest.objects.select_related('last_change')\
+                        .filter(project__in=Project.active.all())
+    test_lists = dict((project.pk, []) for project in projects)
+    for test in tests:
+        test_lists[test.project_id].append(test)
+    for project in projects:
+        project.test_list = test_lists[project.pk]
+        # Saves Project.last_log() from looking it up again.
+        changes = [test.last_change for test in project.test_list
+                   if test.last_change is not None]
+        project._last_log = max(changes, key=lambda c: c.date_added) \
+                                if changes else None
+    return projects
+
+
+def get_cursor():
+    """Returns the pk of the latest StatusChange, or 0 if there are none.
+    """
+    cursor = StatusChange.objects.order_by('-pk')\
+                        .values_list('pk', flat=True)[:1]
+    return cursor[0] if cursor else 0
+
+
+def get_request_version(request):
+    """Returns the state version, looked up just the once per request.
+    """
+    if not hasattr(request, '_scout_version'):
+        request._scout_version = get_version()
+    return request._scout_version
+
+
+def state_etag(request, *args, **kwargs):
+    # Long-polling requests are answered once the state has changed 
+    # so are left out of the conditional processing.
+    if 'wait' not in request.GET:
+        return get_request_version(request)
+
+
+def get_wall_version(request):
+    """Returns the version of the wall; the state version and the 
+    current minute, as the wall shows how long ago things happened.
+    """
+    if not hasattr(request, '_scout_wall_version'):
+        request._scout_wall_version = '%s-%s' % (
+                get_request_version(request),
+                datetime.datetime.now().strftime('%Y%m%d%H%M'))
+    return request._scout_wall_version
+
+
+def wall_etag(request, *args, **kwargs):
+    return get_wall_version(request)
 
-from scout.models import Project
 
 class WallView(ListView):
 
@@ -8,15 +81,153 @@ class WallView(ListView):
     template_name = 'scout/wall.html'
     context_object_name = 'projects'
 
+    @method_decorator(condition(etag_func=wall_etag))
+    def dispatch(self, request, *args, **kwargs):
+        return super(WallView, self).dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        """Serves the wall from the cache for as long as the 
+        monitoring state hasn't changed, within the minute.
+        """
+        key = 'scout:wall:%s' % get_wall_version(request)
+        content = cache.get(key)
+        if content is None:
+            response = super(WallView, self).get(request, *args, **kwargs)
+            response.render()
+            if response.status_code != 200:
+                return response
+            content = response.content
+            cache.set(key, content, WALL_CACHE_TIMEOUT)
+        return HttpResponse(content)
+
     def get_queryset(self):
-        return Project.active.all().order_by('working', 'client__name', 'name')
+        return get_projects()
 
     def get_context_data(self, **kwargs):
         context = super(WallView, self).get_context_data(**kwargs)
-        try:
-            last_update = Project.active.all()\
-                            .order_by('-date_updated')[0].date_updated
-        except IndexError:
-            last_update = None
+        last_update = None
+        if self.object_list:
+            last_update = max(project.date_updated 
+                              for project in self.object_list)
         context['last_update'] = last_update
+        context['cursor'] = get_cursor()
         return context
+
+
+class StatusView(View):
+    """A JSON view of the monitoring state. Without any arguments it
+    returns the current state of every active project and test, along 
+    with a `cursor`; passing that back as `since` then returns only 
+    the status changes logged after it (oldest first, up to 
+    SCOUT_API_CHANGES_LIMIT at a time) and the current status of the
+    projects they belong to, plus a new cursor to carry on from.
+
+    Adding `wait` to a `since` request long-polls; if there are no 
+    changes yet the response is held until one is logged or 
+    SCOUT_LONG_POLL_TIMEOUT seconds have passed.
+    """
+
+    @method_decorator(condition(etag_func=state_etag))
+    def dispatch(self, request, *args, **kwargs):
+        return super(StatusView, self).dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        since = request.GET.get('since')
+        if since is None:
+            return self.render_to_response(self.get_state())
+        try:
+            since = int(since)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid cursor.')
+        data = self.get_changes(since)
+        if 'wait' in request.GET and not data['changes']:
+            if wait_for_change(since, LONG_POLL_TIMEOUT):
+                data = self.get_changes(since)
+        return self.render_to_response(data)
+
+    def render_to_response(self, data):
+        return HttpResponse(simplejson.dumps(data, cls=DjangoJSONEncoder),
+                            content_type='application/json')
+
+    def get_state(self):
+        """Returns the full current state, and a cursor for it.
+        """
+        # Read the cursor first so nothing logged while the state is
+        # being read can be missed (at worst it's sent twice).
+        cursor = get_cursor()
+        projects = []
+        for project in get_projects():
+            data = self.serialize_project(project)
+            data.update({
+                'client': project.client.name,
+                'name': project.name,
+                'slug': project.slug,
+                'tests': [self.serialize_test(test) 
+                          for test in project.test_list],
+            })
+            projects.append(data)
+        return {'cursor': cursor, 'projects': projects}
+
+    def get_changes(self, since):
+        """Returns the changes logged after the cursor, along with the 
+        current status of their projects and the new cursor.
+        """
+        changes = list(StatusChange.objects.filter(pk__gt=since)\
+                            .select_related('test').order_by('pk')\
+                            [:API_CHANGES_LIMIT])
+        projects = Project.objects.filter(
+                            pk__in=set(c.test.project_id for c in changes))
+        return {
+            'cursor': changes[-1].pk if changes else since,
+            'changes': [self.serialize_change(change) for change in changes],
+            'projects': [self.serialize_project(project) 
+                         for project in projects],
+        }
+
+    def serialize_project(self, project):
+        return {
+            'id': project.pk,
+            'working': project.working,
+            'date_updated': project.date_updated,
+        }
+
+    def serialize_test(self, test):
+        change = test.last_change
+        return {
+            'id': test.pk,
+            'url': test.url,
+            'is_active': test.is_active,
+            'expected_status': test.expected_status,
+            'result': test.last_result or None,
+            'returned_status': change.returned_status if change else None,
+            'failure': (change.failure or None) if change else None,
+            'last_changed': change.date_added if change else None,
+            'last_checked': test.last_checked,
+        }
+
+    def serialize_change(self, change):
+        return {
+            'id': change.pk,
+            'test': change.test_id,
+            'project': change.test.project_id,
+            'expected_status': change.expected_status,
+            'returned_status': change.returned_status,
+            'result': change.result,
+            'failure': change.failure or None,
+            'date_added': change.date_added,
+        }
+
+
+class MetricsView(View):
+    """Exports the pinger's timings, counts and run-level gauges in
+    the Prometheus text format.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not is_cache_shared():
+            # Rather than zeros, which would look like an idle pinger.
+            return HttpResponse('The metrics need a cache shared between '
+                                'processes, see scout.metrics.\n',
+                                content_type='text/plain', status=503)
+        return HttpResponse(render_metrics(),
+                            content_type='text/plain; version=0.0.4')
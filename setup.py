@@ -15,7 +15,7 @@ setup(
     url='https://github.com/theteam/django-scout',
     packages=find_packages(exclude=['tests']),
     include_package_data=True,
-    install_requires=['requests>=0.4',
+    install_requires=['requests>=2.4',
                       'lockfile>=0.9.1',
                       'PIL>=1.1.7'],
     classifiers=[
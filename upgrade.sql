@@ -0,0 +1,31 @@
+-- Upgrades the tables of an existing django-scout install to this
+-- version; syncdb creates the new tables (scout_pingernode,
+-- scout_responsetimerollup, scout_uptimebucket and, with
+-- scout.notifications, notifications_notification) but never adds
+-- columns or indexes to existing ones. Run it once, before syncdb:
+--
+--     ./manage.py dbshell < upgrade.sql
+--     ./manage.py syncdb
+--
+-- Written for SQLite and MySQL. On PostgreSQL use "timestamp with time
+-- zone" for datetime and "double precision" for real, and drop
+-- "unsigned".
+
+ALTER TABLE scout_statustest ADD COLUMN request_method varchar(4) NOT NULL DEFAULT 'GET';
+ALTER TABLE scout_statustest ADD COLUMN max_body_bytes integer unsigned NULL;
+ALTER TABLE scout_statustest ADD COLUMN connect_timeout real NULL;
+ALTER TABLE scout_statustest ADD COLUMN read_timeout real NULL;
+ALTER TABLE scout_statustest ADD COLUMN last_change_id integer NULL REFERENCES scout_statuschange (id);
+ALTER TABLE scout_statustest ADD COLUMN last_result varchar(3) NOT NULL DEFAULT '';
+ALTER TABLE scout_statustest ADD COLUMN last_checked datetime NULL;
+ALTER TABLE scout_statustest ADD COLUMN check_interval integer unsigned NULL;
+ALTER TABLE scout_statustest ADD COLUMN next_check datetime NULL;
+ALTER TABLE scout_statustest ADD COLUMN etag varchar(255) NOT NULL DEFAULT '';
+ALTER TABLE scout_statustest ADD COLUMN last_modified varchar(255) NOT NULL DEFAULT '';
+CREATE INDEX scout_statustest_last_change_id ON scout_statustest (last_change_id);
+CREATE INDEX scout_statustest_next_check ON scout_statustest (next_check);
+
+ALTER TABLE scout_statuschange ADD COLUMN failure varchar(10) NOT NULL DEFAULT '';
+CREATE INDEX scout_statuschange_date_added ON scout_statuschange (date_added);
+-- From scout/sql/statuschange.sql, which syncdb only runs for new tables.
+CREATE INDEX scout_statuschange_test_id_date_added ON scout_statuschange (test_id, date_added);